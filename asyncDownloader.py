@@ -0,0 +1,387 @@
+import asyncio
+import functools
+import os
+import queue
+import random
+import threading
+import time
+import poolDownloader
+import fileManifest
+import contentStore
+import rateLimiter
+import storageLayout
+import metrics
+import postProcess
+import transport
+from poolDownloader import log_event, failed_log
+
+try:
+    import aiohttp
+except ImportError:  # optional dependency, only needed for downloadEngine: asyncio
+    aiohttp = None
+
+
+def available():
+    return aiohttp is not None
+
+
+class RequestBudget:
+
+    ## Shared pacing for every coroutine. Instead of each worker sleeping on its own,
+    ## request starts are spaced so the aggregate rate matches `workers` threads
+    ## that each wait timeBetweenFiles between requests. When the adaptive rate
+    ## limiter is on, coroutines draw from its bucket like every other request.
+
+    def __init__(self, timeBetweenFiles, workers):
+        self.interval = (timeBetweenFiles / 1000) / max(workers, 1)  # ms -> seconds, split across the budget
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def take(self):
+        if rateLimiter.active():
+            wait = rateLimiter.reserve()
+            if wait:
+                await asyncio.sleep(wait)
+            return
+
+        if self.interval <= 0:
+            return
+
+        async with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._next - now)
+            self._next = max(now, self._next) + self.interval * (0.1 + random.random())  # same jitter as randomDelay
+
+        if wait:
+            await asyncio.sleep(wait)
+
+
+async def _inThread(func, *args, **kwargs):
+
+    ## Run a blocking call (disk, hashing, SQLite) on the default executor, so one slow write or
+    ## manifest commit never stalls every other transfer on the event loop
+
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+def _partSize(part):
+    return os.path.getsize(part) if os.path.exists(part) else 0
+
+
+def _writeChunk(f, hasher, chunk):
+    f.write(chunk)
+    hasher.update(chunk)
+
+
+def _localSize(path):
+    # size of the file at path, None when there is none
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def _finishedBefore(url, path, verifyHashes):
+    return fileManifest.isComplete(url, path) and (not verifyHashes or contentStore.verify(url, path))
+
+
+def _recordDownload(url, path, total, bytes_written, sha256):
+    fileManifest.markStatus(url, fileManifest.DONE, remote_size=total, local_size=bytes_written, sha256=sha256)
+    try:
+        contentStore.storeOnce(url, path, sha256, bytes_written)  # duplicate content becomes a hardlink
+    except OSError:
+        pass
+
+
+async def _head_with_retry(client, budget, url, retries=3, base_delay=0.5):
+    with metrics.head_seconds.time():
+        return await _head_attempts(client, budget, url, retries, base_delay)
+
+
+async def _head_attempts(client, budget, url, retries, base_delay):
+    for attempt in range(retries):
+        await budget.take()
+        try:
+            async with client.head(url, allow_redirects=True, timeout=aiohttp.ClientTimeout(total=5)) as r:
+                rateLimiter.feedback(r.status, r.headers)
+
+                # Rate limiting or temporary denial
+                if r.status in (403, 429, 503):
+                    await asyncio.sleep(base_delay * (0.1 + random.random()))
+                    continue
+
+                return r
+
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            await asyncio.sleep(base_delay * (0.1 + random.random()))
+
+    return None
+
+
+async def _download_resumable(client, budget, url, path, progress, retries=3, base_delay=1.0):
+
+    ## Coroutine version of poolDownloader.download_resumable: stream into a .part file,
+    ## resume with a Range request and only rename once the full length has arrived.
+    ## Placeholders are classified from the first bytes and never written.
+
+    part = path + ".part"
+    if not poolDownloader.claimPart(part):
+        raise poolDownloader.AlreadyDownloading(part)
+    try:
+        return await _download_part(client, budget, url, path, part, progress, retries, base_delay)
+    finally:
+        poolDownloader.releasePart(part)
+
+
+async def _download_part(client, budget, url, path, part, progress, retries, base_delay):
+
+    await _inThread(os.makedirs, os.path.dirname(path), exist_ok=True)
+
+    last_error = None
+
+    for attempt in range(retries):
+        offset = await _inThread(_partSize, part)
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+
+        await budget.take()
+        try:
+            requested = time.monotonic()
+            async with client.get(url, headers=headers) as r:
+                metrics.download_ttfb_seconds.observe(time.monotonic() - requested)
+                rateLimiter.feedback(r.status, r.headers)
+
+                if r.status == 416:  # nothing left after offset: complete, or no longer matching
+                    finished = await _inThread(poolDownloader.finishCompletePart, r, part, path, offset)
+                    if finished:
+                        return finished[0], offset, finished[1], False
+                    await _inThread(os.remove, part)
+                    continue
+
+                r.raise_for_status()
+
+                if r.status == 206:
+                    start, total = poolDownloader._content_range_start_total(r)
+                    if start != offset:
+                        await _inThread(os.remove, part)
+                        continue
+                    mode = "ab"
+                    hasher = await _inThread(contentStore.newHasher, part)
+                else:
+                    offset = 0
+                    total = r.content_length
+                    mode = "wb"
+                    hasher = contentStore.newHasher()
+
+                written = offset
+                chunks = r.content.iter_chunked(poolDownloader.chunkSize(total))
+
+                # hold back the first bytes of a fresh transfer until the classifier has decided
+                head = b""
+                verdict = False if mode == "ab" else None
+                while verdict is None:
+                    try:
+                        chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        verdict = poolDownloader.classifyPlaceholder(total, head, complete=True)
+                        break
+                    head += chunk
+                    verdict = poolDownloader.classifyPlaceholder(total, head, complete=False)
+
+                if verdict:
+                    hasher.update(head)
+                    return total, len(head), hasher.hexdigest(), True
+
+                f = await _inThread(open, part, mode)
+                try:
+                    if head:
+                        await _inThread(_writeChunk, f, hasher, head)
+                        written += len(head)
+                        progress.advance(len(head))
+
+                    async for chunk in chunks:
+                        if not chunk:
+                            continue
+                        await _inThread(_writeChunk, f, hasher, chunk)
+                        written += len(chunk)
+                        progress.advance(len(chunk))
+                finally:
+                    await _inThread(f.close)
+
+            if total is None or written == total:
+                await _inThread(os.replace, part, path)
+                poolDownloader.recordTransfer(written - offset, time.monotonic() - requested)
+                return total, written, hasher.hexdigest(), False
+
+            last_error = OSError(f"Incomplete transfer, {written} of {total} bytes")
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            if not poolDownloader.retryable(e):
+                raise  # e.g. 404: asking again only costs requests and sleep
+            last_error = e
+
+        await asyncio.sleep(base_delay * (attempt + 1) * (0.1 + random.random()))
+
+    raise last_error if last_error else OSError(f"Could not download {url}")
+
+
+async def _download_one(poolObject, client, budget, out_dir, trustLocalFiles, progress, downloadRetries=3, verifyHashes=False):
+
+    _dataset = poolObject[0]
+    _filepage = poolObject[1]
+    _url = poolObject[2]
+
+    poolDownloader.setLastLocation((_dataset, _filepage))
+
+    filename = os.path.basename(_url)
+    path = storageLayout.filePath(out_dir, _dataset, filename)
+
+    if await _inThread(_finishedBefore, _url, path, verifyHashes):
+        metrics.files.inc(labels={"result": "skipped"})
+        poolDownloader.incrementDownloadCount()
+        return
+
+    local_size = await _inThread(_localSize, path)
+
+    if trustLocalFiles:
+        if local_size is not None:
+            await _inThread(fileManifest.markStatus, _url, fileManifest.DONE, local_size=local_size)
+            postProcess.submit(_url, path)
+            metrics.files.inc(labels={"result": "skipped"})
+            poolDownloader.incrementDownloadCount()
+            return
+
+    elif local_size is not None:
+        try:
+            head = await _head_with_retry(client, budget, _url, retries=5, base_delay=1)
+            if head is not None and head.status == 200 and head.content_length:
+                remote_size = head.content_length
+
+                # Skip if identical and not the small "No Images Produced" PDF
+                if local_size == remote_size and not poolDownloader.placeholderSized(remote_size):
+                    await _inThread(fileManifest.markStatus, _url, fileManifest.DONE, remote_size=remote_size, local_size=local_size)
+                    postProcess.submit(_url, path)
+                    metrics.files.inc(labels={"result": "skipped"})
+                    poolDownloader.incrementDownloadCount()
+                    return
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            pass  # no answer to compare against, download it again
+
+    started = time.monotonic()
+    try:
+        total, bytes_written, sha256, placeholder = await _download_resumable(client, budget, _url, path, progress, retries=downloadRetries)
+
+    except poolDownloader.AlreadyDownloading:
+        return  # the coroutine holding the .part records the outcome
+
+    except Exception as e:
+        poolDownloader.incrementErrorCount()
+        metrics.files.inc(labels={"result": "failed"})
+        await _inThread(fileManifest.markStatus, _url, fileManifest.FAILED)
+        log_event(
+            failed_log,
+            f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Dataset {_dataset} | Page {_filepage} | {_url} | {type(e).__name__} | {str(e)}",
+            event="download_failed", dataset=_dataset, page=_filepage, url=_url, status=poolDownloader.httpStatus(e),
+            exception=type(e).__name__, error=str(e), seconds=round(time.monotonic() - started, 3)
+        )
+        return
+
+    poolDownloader.setLastLocation((_dataset, _filepage))
+    poolDownloader.incrementDownloadCount()
+
+    if placeholder:
+        # recognised while streaming, nothing was written; resolved by the probe stage threads
+        await _inThread(fileManifest.markStatus, _url, fileManifest.PROBING, remote_size=total, sha256=sha256)
+        metrics.files.inc(labels={"result": "placeholder"})
+        poolDownloader.queueProbe(poolObject, pooled=True)
+        return True  # finished by the probe stage
+
+    await _inThread(_recordDownload, _url, path, total, bytes_written, sha256)
+    metrics.files.inc(labels={"result": "downloaded"})
+
+    postProcess.submit(_url, path, sha256)
+
+
+async def _run(out_dir, concurrency, workers, timeBetweenFiles, session, trustLocalFiles, progress, layout, downloadRetries, verifyHashes):
+
+    loop = asyncio.get_running_loop()
+    budget = RequestBudget(timeBetweenFiles, workers)
+    inbox = asyncio.Queue(maxsize=concurrency)
+
+    # carry over the browser headers and age verification cookie from the requests session
+    headers = dict(session.headers) if session is not None else {}
+    cookies = {c.name: c.value for c in session.cookies} if session is not None else {}
+
+    task_id = progress.add_task(f"Async engine ({concurrency} slots)", total=None)
+    batcher = poolDownloader.ProgressBatcher(progress, task_id)  # every coroutine runs on this loop, no lock needed
+
+    await loop.run_in_executor(None, poolDownloader._start_event.wait)
+
+    async def feeder():
+        # the shared pool is a thread queue, so pull from it off the event loop
+        while True:
+            try:
+                poolObject = await loop.run_in_executor(None, poolDownloader._pool.get, 1)
+            except queue.Empty:
+                continue
+
+            if poolObject is None:  # pool closed and drained, or cancelled
+                break
+
+            await inbox.put(poolObject)
+
+        for _ in range(concurrency):
+            await inbox.put(None)
+
+    async def worker(client):
+        while True:
+            poolObject = await inbox.get()
+            if poolObject is None:
+                break
+            probing = False
+            try:
+                probing = await _download_one(poolObject, client, budget, out_dir, trustLocalFiles, batcher, downloadRetries, verifyHashes)
+            finally:
+                if not probing:
+                    await _inThread(poolDownloader._pool.task_done, poolObject)  # a spill queue deletes its row
+
+    async def header():
+        last_status = time.monotonic()
+        while True:
+            batcher.flush()
+            if poolDownloader.isHeadless():
+                if time.monotonic() - last_status >= poolDownloader._status_interval:
+                    poolDownloader.printStatus()
+                    last_status = time.monotonic()
+            else:
+                layout["header"].update(poolDownloader.headerPanel())
+            await asyncio.sleep(0.2)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(headers=headers, cookies=cookies, connector=connector,
+                                     timeout=aiohttp.ClientTimeout(sock_read=60),
+                                     trace_configs=[transport.aiohttpTrace()]) as client:
+        header_task = asyncio.create_task(header())
+        await asyncio.gather(feeder(), *(worker(client) for _ in range(concurrency)))
+        header_task.cancel()
+        batcher.flush()
+        if poolDownloader.isHeadless():
+            poolDownloader.printStatus()
+
+
+def downloadFromPoolAsync(out_dir, concurrency=200, workers=8, timeBetweenFiles=10, session=None, trustLocalFiles=False, downloadRetries=3,
+                          probeWorkers=2, timeBetweenProbes=None, verifyHashes=False):
+
+    if aiohttp is None:
+        raise RuntimeError("downloadEngine 'asyncio' requires the aiohttp package")
+
+    os.makedirs(out_dir, exist_ok=True)
+    os.makedirs(os.path.join("logs"), exist_ok=True)
+
+    # register this thread so empty_pool and finish_pool wait for it
+    poolDownloader._workers.append(threading.current_thread())
+
+    progress, layout, live = poolDownloader.newDisplay(time_remaining=False)
+
+    with live:
+        poolDownloader.startProbers(session, probeWorkers, timeBetweenFiles if timeBetweenProbes is None else timeBetweenProbes)
+        asyncio.run(_run(out_dir, concurrency, workers, timeBetweenFiles, session, trustLocalFiles, progress, layout, downloadRetries, verifyHashes))
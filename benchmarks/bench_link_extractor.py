@@ -0,0 +1,101 @@
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import linkExtractor
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+
+## Compares the listing page extractors on the saved pages in benchmarks/fixtures:
+## time per page and peak traced memory for one parse.
+##
+##     python benchmarks/bench_link_extractor.py [repeats]
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "*.html")
+
+
+def parse_bs4(html):
+
+    # the BeautifulSoup path updatePool used before linkExtractor, kept here as the baseline
+
+    soup = BeautifulSoup(html, "html.parser")
+
+    page_files = sorted({
+        a["href"].split("/")[-1]
+        for a in soup.find_all("a", href=True)
+        if "/epstein/files/" in a["href"] and "EFTA" in a["href"]
+    })
+    pagination = soup.find(class_="usa-pagination")
+
+    return {
+        "files": page_files,
+        "pagination": pagination is not None,
+        "has_next": pagination is not None and pagination.find("a", attrs={"aria-label": "Next page"}) is not None,
+        "access_denied": soup.find(title_="Access Denied") is not None,
+        "generating_files": bool(soup.find_all('link', href= "list%20still%20generating_files/slick.css")),
+    }
+
+
+def measure(parse, pages, repeats):
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for html in pages:
+            parse(html)
+    per_page = (time.perf_counter() - start) / (repeats * len(pages))
+
+    peak = 0
+    for html in pages:
+        tracemalloc.start()
+        parse(html)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return per_page, peak
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    paths = sorted(glob.glob(FIXTURES))
+    pages = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+
+    if not pages:
+        print(f"No fixtures found at {FIXTURES}")
+        return
+
+    candidates = [("html.parser tokenizer", linkExtractor.extract_tokenizer)]
+    if linkExtractor.lxml is not None:
+        candidates.append(("lxml", linkExtractor.extract_lxml))
+    if BeautifulSoup is not None:
+        candidates.append(("BeautifulSoup (baseline)", parse_bs4))
+
+    # every backend has to agree with the first one before its numbers mean anything
+    reference = [candidates[0][1](html) for html in pages]
+    for name, parse in candidates[1:]:
+        for path, html, expected in zip(paths, pages, reference):
+            result = parse(html)
+            if result != expected:
+                print(f"WARNING: {name} disagrees on {os.path.basename(path)}: {result} != {expected}")
+
+    print(f"{len(pages)} fixture pages, {repeats} repeats")
+    print(f"{'backend':<28}{'ms/page':>10}{'peak KiB':>12}")
+
+    for name, parse in candidates:
+        per_page, peak = measure(parse, pages, repeats)
+        print(f"{name:<28}{per_page * 1000:>10.3f}{peak / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
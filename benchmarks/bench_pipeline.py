@@ -0,0 +1,134 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakeJusticeGov
+
+
+## Runs the real scraper (updatePool discovery plus the downloadFromPool workers) end to end
+## against the local stand-in server, once per combination of the settings under test, and
+## reports files/sec, bytes/sec, requests per file and time to the first finished download.
+## Every run starts from an empty directory and manifest, so the numbers compare cold crawls.
+##
+##     python benchmarks/bench_pipeline.py --workers 4,8,16 --pool-size 100,600 --error-rate 0.02
+
+SCRAPER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "epsteinScraper.py")
+
+
+def intList(value):
+    return [int(v) for v in value.split(",")]
+
+
+def scrapedFiles(out_dir):
+    count = size = 0
+    for root, _, names in os.walk(out_dir):
+        for name in names:
+            if name.endswith(".part"):
+                continue
+            count += 1
+            size += os.path.getsize(os.path.join(root, name))
+    return count, size
+
+
+def run(args, workers, pool_size):
+    catalog = fakeJusticeGov.Catalog(
+        fakeJusticeGov.parseDatasets(args.datasets),
+        files_per_page=args.files_per_page,
+        placeholder_rate=args.placeholder_rate,
+        video_size=args.video_size,
+    )
+    server = fakeJusticeGov.FakeJusticeGov(
+        catalog, error_rate=args.error_rate, latency=args.latency, bandwidth=args.bandwidth
+    ).start()
+
+    with tempfile.TemporaryDirectory(prefix="scraper-bench-") as work_dir:
+        out_dir = os.path.join(work_dir, "files")
+        config = {
+            "baseUrl": server.url,
+            "directory": out_dir,
+            "datasets": sorted(catalog.datasets),
+            "downloadWorkers": workers,
+            "poolSize": pool_size,
+            "downloadEngine": args.engine,
+            "timeBetweenPages": args.delay,
+            "timeBetweenFiles": args.delay,
+            "timeBetweenProbes": args.delay,
+            "timeBetween403": 200,
+            "fetchRetries": 10,
+            "adaptiveRateLimit": args.rate > 0,
+            "requestsPerSecond": max(args.rate, 1),
+            "maxRequestsPerSecond": max(args.rate, 1) * 4,
+        }
+        with open(os.path.join(work_dir, "config.yaml"), "w") as f:
+            yaml.dump(config, f)
+
+        started = time.time()
+        try:
+            subprocess.run([sys.executable, SCRAPER], cwd=work_dir, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, timeout=args.timeout, check=False)
+            timed_out = False
+        except subprocess.TimeoutExpired:
+            timed_out = True
+        elapsed = time.time() - started
+
+        files, size = scrapedFiles(out_dir)
+
+    stats = server.stats()
+    server.stop()
+
+    first = stats["first_file_time"] - started if stats["first_file_time"] else None
+    return {
+        "workers": workers,
+        "pool_size": pool_size,
+        "elapsed": elapsed,
+        "files": files,
+        "bytes": size,
+        "requests": stats["requests"],
+        "first": first,
+        "timed_out": timed_out,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper pipeline against a local justice.gov stand-in")
+    parser.add_argument("--workers", type=intList, default=[8], help="downloadWorkers values, e.g. 4,8,16")
+    parser.add_argument("--pool-size", type=intList, default=[600], help="poolSize values")
+    parser.add_argument("--engine", default="threads", choices=("threads", "asyncio"))
+    parser.add_argument("--delay", type=float, default=0, help="timeBetweenPages/Files/Probes in ms")
+    parser.add_argument("--rate", type=float, default=200, help="requestsPerSecond, 0 disables the adaptive limiter")
+    parser.add_argument("--datasets", default="1:4,2:2", help="dataset:pages pairs served by the stand-in")
+    parser.add_argument("--files-per-page", type=int, default=50)
+    parser.add_argument("--placeholder-rate", type=float, default=0.05)
+    parser.add_argument("--video-size", type=int, default=2_000_000)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=float, default=None)
+    parser.add_argument("--timeout", type=float, default=600, help="seconds before a run is abandoned")
+    args = parser.parse_args()
+
+    print(f"{'workers':>8}{'pool':>7}{'files':>7}{'files/s':>9}{'MB/s':>8}{'req/file':>10}{'first (s)':>11}{'total (s)':>11}")
+
+    for workers in args.workers:
+        for pool_size in args.pool_size:
+            result = run(args, workers, pool_size)
+            files = result["files"]
+            elapsed = result["elapsed"]
+            first = f"{result['first']:.2f}" if result["first"] is not None else "-"
+            note = "  timed out" if result["timed_out"] else ""
+            print(
+                f"{workers:>8}{pool_size:>7}{files:>7}"
+                f"{files / elapsed:>9.1f}{result['bytes'] / elapsed / 1e6:>8.2f}"
+                f"{(result['requests'] / files if files else 0):>10.2f}"
+                f"{first:>11}{elapsed:>11.2f}{note}"
+            )
+
+
+if __name__ == "__main__":
+    main()
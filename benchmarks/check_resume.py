@@ -0,0 +1,155 @@
+import argparse
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakeJusticeGov
+
+
+## Checks that a crawl which is interrupted and then resumed ends with the same manifest as one
+## that ran straight through. Both runs crawl the same deterministic catalog on the local stand-in
+## server; the second one is stopped with SIGINT (Ctrl+C) or SIGKILL after --stop-after seconds and
+## started again. Every file's status, alternate, size and hash are compared, timestamps are not.
+## It also fails when a file was downloaded twice: sent to two workers at once, or requested more
+## than once by one run (the run that was stopped may have left a .part, resumed with one Range GET).
+## Exits 1 and lists the differing rows and files.
+##
+##     python benchmarks/check_resume.py --signal kill --stop-after 2 --spill-queue
+
+SCRAPER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "epsteinScraper.py")
+COLUMNS = ("status", "alt_url", "local_size", "sha256")
+
+
+def writeConfig(args, work_dir, url):
+    config = {
+        "baseUrl": url,
+        "directory": os.path.join(work_dir, "files"),
+        "datasets": sorted(fakeJusticeGov.parseDatasets(args.datasets)),
+        "downloadWorkers": args.workers,
+        "downloadEngine": args.engine,
+        "probeWorkers": 1,  # keeps placeholders waiting in the probe queue when the run is stopped
+        "timeBetweenPages": 0,
+        "timeBetweenFiles": 0,
+        "timeBetweenProbes": 0,
+        "timeBetween403": 200,
+        "adaptiveRateLimit": False,
+        "spillQueue": args.spill_queue,
+        "headless": True,
+    }
+    with open(os.path.join(work_dir, "config.yaml"), "w") as f:
+        yaml.dump(config, f)
+
+
+def crawl(work_dir, timeout, stop_after=None, stop_signal=None):
+    process = subprocess.Popen([sys.executable, SCRAPER, "crawl"], cwd=work_dir,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if stop_after is not None:
+        try:
+            process.wait(stop_after)
+            return False  # finished before it could be stopped
+        except subprocess.TimeoutExpired:
+            process.send_signal(stop_signal)
+    process.wait(timeout)
+    return True
+
+
+def manifestRows(work_dir):
+    db = sqlite3.connect(os.path.join(work_dir, "manifest.db"))
+    try:
+        return {row[0]: row[1:] for row in db.execute(f"SELECT url, {', '.join(COLUMNS)} FROM files")}
+    finally:
+        db.close()
+
+
+def pagesPerDataset(work_dir):
+    db = sqlite3.connect(os.path.join(work_dir, "manifest.db"))
+    try:
+        return dict(db.execute("SELECT dataset, COUNT(DISTINCT page) FROM files GROUP BY dataset"))
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an interrupted and resumed crawl with an uninterrupted one")
+    parser.add_argument("--signal", default="int", choices=("int", "kill"), help="stop the first run with SIGINT or SIGKILL")
+    parser.add_argument("--stop-after", type=float, default=2.0, help="seconds before the first run is stopped")
+    parser.add_argument("--engine", default="threads", choices=("threads", "asyncio"))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--spill-queue", action="store_true", help="run with spillQueue enabled")
+    parser.add_argument("--datasets", default="1:3,2:2", help="dataset:pages pairs served by the stand-in")
+    parser.add_argument("--files-per-page", type=int, default=50, help="at least 40, a shorter page ends the dataset")
+    parser.add_argument("--placeholder-rate", type=float, default=0.2)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response, so the stop lands mid-run")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds before a run is abandoned")
+    args = parser.parse_args()
+
+    if args.files_per_page < 40:
+        parser.error("--files-per-page must be at least 40, the scraper treats a shorter page as the last one")
+
+    catalog = fakeJusticeGov.Catalog(fakeJusticeGov.parseDatasets(args.datasets), files_per_page=args.files_per_page,
+                                     placeholder_rate=args.placeholder_rate, video_size=200_000)
+    server = fakeJusticeGov.FakeJusticeGov(catalog, latency=args.latency).start()
+    stop_signal = signal.SIGINT if args.signal == "int" else signal.SIGKILL
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="scraper-resume-") as straight_dir, \
+             tempfile.TemporaryDirectory(prefix="scraper-resume-") as resumed_dir:
+
+            writeConfig(args, straight_dir, server.url)
+            writeConfig(args, resumed_dir, server.url)
+
+            stats = server.httpd.stats
+            repeated = []  # (run, path, GETs)
+
+            started = time.time()
+            crawl(straight_dir, args.timeout)
+            print(f"Uninterrupted crawl: {time.time() - started:.1f}s")
+            before = stats.fileGets()
+            repeated += [("uninterrupted", path, n) for path, n in before.items() if n > 1]
+
+            if not crawl(resumed_dir, args.timeout, args.stop_after, stop_signal):
+                print(f"The crawl finished within {args.stop_after}s, use a smaller --stop-after")
+                return 1
+            interrupted = manifestRows(resumed_dir)
+            print(f"Stopped with SIG{args.signal.upper()} after {args.stop_after}s, "
+                  f"{sum(1 for row in interrupted.values() if row[0] != 'pending')} of {len(interrupted)} files had an outcome")
+            stopped = stats.fileGets()
+            repeated += [("stopped", path, n - before.get(path, 0)) for path, n in stopped.items() if n - before.get(path, 0) > 1]
+
+            crawl(resumed_dir, args.timeout)
+            resumed = stats.fileGets()
+            repeated += [("resumed", path, n - stopped.get(path, 0)) for path, n in resumed.items() if n - stopped.get(path, 0) > 1]
+            overlapping = sorted(stats.overlapping)
+
+            expected, actual = manifestRows(straight_dir), manifestRows(resumed_dir)
+            pages = pagesPerDataset(resumed_dir)
+    finally:
+        server.stop()
+
+    differing = sorted(url for url in expected.keys() | actual.keys() if expected.get(url) != actual.get(url))
+    for url in differing:
+        print(f"{url}\n    uninterrupted: {dict(zip(COLUMNS, expected.get(url, ())))}\n    resumed:       {dict(zip(COLUMNS, actual.get(url, ())))}")
+    for run, path, gets in repeated:
+        print(f"{path} requested {gets} times by the {run} run")
+    for path in overlapping:
+        print(f"{path} sent to two workers at once")
+
+    # a dataset that ends on its first page never stops and resumes between pages
+    single = sorted(dataset for dataset in catalog.datasets if pages.get(dataset, 0) < 2)
+    for dataset in single:
+        print(f"Dataset {dataset}: {pages.get(dataset, 0)} page(s) crawled, the check needs more than one")
+
+    print(f"{len(expected)} files, {len(differing)} differ, {len(repeated)} requested twice, {len(overlapping)} downloaded concurrently")
+    return 1 if differing or repeated or overlapping or single else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
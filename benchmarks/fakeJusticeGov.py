@@ -0,0 +1,388 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+## Local stand-in for the justice.gov Epstein pages, for benchmarking without touching the live site.
+## Serves synthetic data-set-N-files?page=P listings with usa-pagination, EFTA file URLs behind them,
+## "No Images Produced" ReportLab placeholders (some with an alternate such as .mp4 behind them),
+## large alternate bodies, Range requests, and optional injected 403/429/500 responses, latency and
+## bandwidth limits. Bodies start with the magic bytes of their type and PDFs end with %%EOF, so
+## verify and the postProcess checks pass. Every request is counted, GET /__stats returns the
+## counters as JSON.
+##
+##     python benchmarks/fakeJusticeGov.py --port 8000 --datasets 1:5,2:3
+##
+## then set baseUrl: http://127.0.0.1:8000 in config.yaml.
+
+LISTING_PATH = re.compile(r"^/epstein/doj-disclosures/data-set-(\d+)-files(?:\?page=(\d+))?$")
+FILE_PATH = re.compile(r"^/epstein/files/DataSet(?:%20| )(\d+)/(EFTA\d+)(\.\w+)$")
+
+PLACEHOLDER_SIZE = 2433
+ALTERNATE_EXTENSIONS = [".mp4", ".avi", ".wav", ".mov", ".docx"]
+# leading bytes of each body, so verify and the postProcess pdf/mime checks pass on stand-in files
+MAGIC = {
+    "pdf": b"%PDF-1.7\n",
+    ".mp4": b"\x00\x00\x00\x18ftypisom",
+    ".avi": b"RIFF\x00\x00\x00\x00AVI LIST",
+    ".wav": b"RIFF\x00\x00\x00\x00WAVEfmt ",
+    ".mov": b"\x00\x00\x00\x14ftypqt  ",
+    ".docx": b"PK\x03\x04",
+}
+PDF_TRAILER = b"\n%%EOF\n"
+CHUNK = 64 * 1024
+
+
+def placeholderPdf():
+    body = (b"%PDF-1.4\n% ReportLab Generated PDF document http://www.reportlab.com\n"
+            b"1 0 obj\n<< /F1 2 0 R >>\nendobj\n% ReportLab PDF Library - No Images Produced\n")
+    return body + b" " * (PLACEHOLDER_SIZE - len(body) - 6) + b"%%EOF\n"
+
+
+class Catalog:
+
+    ## Deterministic archive layout: which files each page lists and what every URL serves
+
+    def __init__(self, datasets, files_per_page=50, placeholder_rate=0.05, alternate_rate=0.5,
+                 min_size=20_000, max_size=300_000, video_size=5_000_000, seed=0):
+        self.datasets = dict(datasets)  # dataset -> number of pages
+        self.files_per_page = files_per_page
+        self.placeholder_rate = placeholder_rate
+        self.alternate_rate = alternate_rate
+        self.min_size = min_size
+        self.max_size = max_size
+        self.video_size = video_size
+        self.seed = seed
+        self._placeholder = placeholderPdf()
+
+    def pageFiles(self, dataset, page):
+        pages = self.datasets.get(dataset, 0)
+        if page >= pages:
+            return []
+        count = self.files_per_page if page < pages - 1 else self.files_per_page // 2  # short last page
+        first = dataset * 1_000_000 + page * self.files_per_page
+        return [f"EFTA{number:08d}.pdf" for number in range(first, first + count)]
+
+    def fileCount(self):
+        return sum(len(self.pageFiles(d, p)) for d, pages in self.datasets.items() for p in range(pages))
+
+    def _rng(self, name):
+        return random.Random(f"{self.seed}:{name}")
+
+    def describe(self, dataset, stem, ext):
+
+        ## (size, kind) of a file URL, or None when the server answers 404
+
+        number = int(stem[4:])
+        if number // 1_000_000 != dataset or not self._listed(dataset, number):
+            return None
+
+        rng = self._rng(stem)
+        placeholder = rng.random() < self.placeholder_rate
+        alternate = ALTERNATE_EXTENSIONS[rng.randrange(len(ALTERNATE_EXTENSIONS))] if placeholder and rng.random() < self.alternate_rate else None
+
+        if ext == ".pdf":
+            if placeholder:
+                return PLACEHOLDER_SIZE, "placeholder"
+            return rng.randint(self.min_size, self.max_size), "pdf"
+
+        if ext == alternate:
+            return self.video_size, ext  # the kind of an alternate is its extension
+        return None
+
+    def _listed(self, dataset, number):
+        page, index = divmod(number - dataset * 1_000_000, self.files_per_page)
+        return index < len(self.pageFiles(dataset, page))
+
+    def body(self, stem, kind, size, start=0):
+
+        ## Bytes start..size of a file, a seeded block repeated so large bodies cost no memory.
+        ## Starts with the magic bytes of its type, and a PDF ends with a %%EOF trailer.
+
+        if kind == "placeholder":
+            yield self._placeholder[start:]
+            return
+
+        block = self._rng(stem + kind).randbytes(CHUNK)
+        magic = MAGIC.get(kind, b"")
+        block = magic + block[len(magic):]
+
+        trailer = PDF_TRAILER if kind == "pdf" else b""
+        tail_start = size - len(trailer)
+
+        position = start
+        while position < size:
+            offset = position % CHUNK
+            end = min(position + CHUNK - offset, size)
+            piece = block[offset:offset + end - position]
+            if end > tail_start:
+                cut = max(position, tail_start)
+                piece = piece[:cut - position] + trailer[cut - tail_start:end - tail_start]
+            yield piece
+            position = end
+
+
+def listingHtml(catalog, dataset, page):
+    files = catalog.pageFiles(dataset, page)
+    links = "\n".join(
+        f'<li><a href="/epstein/files/DataSet%20{dataset}/{name}">{name}</a></li>' for name in files
+    )
+    next_link = ""
+    if page < catalog.datasets.get(dataset, 0) - 1:
+        next_link = f'<li class="usa-pagination__item"><a href="?page={page + 1}" aria-label="Next page">Next</a></li>'
+
+    return f"""<!DOCTYPE html>
+<html lang="en"><head><title>DataSet {dataset} Files | United States Department of Justice</title></head>
+<body><main><h1>Data Set {dataset} Files</h1>
+<ul class="item-list">
+{links}
+</ul>
+<nav class="usa-pagination" aria-label="Pagination"><ul>
+<li class="usa-pagination__item"><a href="?page={max(page - 1, 0)}" aria-label="Previous page">Previous</a></li>
+{next_link}
+</ul></nav>
+</main></body></html>
+"""
+
+
+class Stats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.requests = 0
+        self.by_kind = {}
+        self.statuses = {}
+        self.bytes_sent = 0
+        self.files_served = 0
+        self.first_file_at = None    # seconds after the server started
+        self.first_file_time = None  # wall clock, for callers that started their own timer
+        self.file_gets = {}          # path -> GETs of a file body
+        self.transfers = {}          # path -> bodies being sent right now
+        self.overlapping = set()     # paths whose body was sent to two clients at once
+
+    def request(self, kind, status):
+        with self._lock:
+            self.requests += 1
+            self.by_kind[kind] = self.by_kind.get(kind, 0) + 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def sent(self, count):
+        with self._lock:
+            self.bytes_sent += count
+
+    def transferStarted(self, path):
+        with self._lock:
+            self.file_gets[path] = self.file_gets.get(path, 0) + 1
+            self.transfers[path] = self.transfers.get(path, 0) + 1
+            if self.transfers[path] > 1:
+                self.overlapping.add(path)
+
+    def transferEnded(self, path):
+        with self._lock:
+            self.transfers[path] -= 1
+
+    def fileGets(self):
+        with self._lock:
+            return dict(self.file_gets)
+
+    def fileServed(self):
+        with self._lock:
+            self.files_served += 1
+            if self.first_file_at is None:
+                self.first_file_at = time.monotonic() - self.started
+                self.first_file_time = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "by_kind": dict(self.by_kind),
+                "statuses": {str(k): v for k, v in self.statuses.items()},
+                "bytes_sent": self.bytes_sent,
+                "files_served": self.files_served,
+                "first_file_at": self.first_file_at,
+                "first_file_time": self.first_file_time,
+                "uptime": time.monotonic() - self.started,
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeJusticeGov/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        if self.path == "/__stats":
+            self._reply(200, json.dumps(self.server.stats.snapshot()).encode(), "application/json", count=False)
+            return
+        self._serve(send_body=True)
+
+    def _fault(self):
+
+        ## Injected failure for this request, or None. Errors are split 403 / 429 / 500.
+
+        options = self.server.options
+        if options["latency"]:
+            time.sleep(options["latency"] * (0.5 + random.random()))
+        if random.random() >= options["error_rate"]:
+            return None
+        return random.choice((403, 429, 500))
+
+    def _serve(self, send_body):
+        catalog = self.server.catalog
+
+        listing = LISTING_PATH.match(self.path)
+        match = FILE_PATH.match(self.path)
+        if listing:
+            kind = "listing"
+        elif match:
+            kind = "file" if send_body else "head"
+        else:
+            kind = "other"
+
+        status = self._fault()
+        if status is not None:
+            headers = {"Retry-After": "1"} if status == 429 else {}
+            self.server.stats.request(kind, status)
+            self._reply(status, b"<html><head><title>Error</title></head></html>", "text/html", headers=headers, send_body=send_body)
+            return
+
+        if listing:
+            dataset, page = int(listing.group(1)), int(listing.group(2) or 0)
+            self.server.stats.request(kind, 200)
+            self._reply(200, listingHtml(catalog, dataset, page).encode(), "text/html; charset=UTF-8", send_body=send_body)
+            return
+
+        described = catalog.describe(int(match.group(1)), match.group(2), match.group(3)) if match else None
+        if described is None:
+            self.server.stats.request(kind, 404)
+            self._reply(404, b"Not Found", "text/plain", send_body=send_body)
+            return
+
+        size, file_kind = described
+        start = 0
+        status = 200
+        headers = {"Accept-Ranges": "bytes"}
+
+        range_header = self.headers.get("Range")
+        if range_header and range_header.startswith("bytes=") and range_header.endswith("-"):
+            start = int(range_header[6:-1] or 0)
+            if start >= size:
+                self.server.stats.request(kind, 416)
+                self._reply(416, b"", "text/plain", headers={"Content-Range": f"bytes */{size}"}, send_body=send_body)
+                return
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{size - 1}/{size}"
+
+        self.server.stats.request(kind, status)
+        content_type = "application/pdf" if match.group(3) == ".pdf" else "application/octet-stream"
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(size - start))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        if not send_body:
+            return
+
+        bandwidth = self.server.options["bandwidth"]
+        self.server.stats.transferStarted(self.path)
+        try:
+            for piece in catalog.body(match.group(2), file_kind, size, start):
+                self.wfile.write(piece)
+                self.server.stats.sent(len(piece))
+                if bandwidth:
+                    time.sleep(len(piece) / bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        finally:
+            self.server.stats.transferEnded(self.path)
+
+        if file_kind != "placeholder":
+            self.server.stats.fileServed()
+
+    def _reply(self, status, body, content_type, headers=None, send_body=True, count=True):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+            if count:
+                self.server.stats.sent(len(body))
+
+
+class FakeJusticeGov:
+
+    ## The stand-in server on a background thread. port=0 picks a free port, see .url
+
+    def __init__(self, catalog, host="127.0.0.1", port=0, error_rate=0.0, latency=0.0, bandwidth=None):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.catalog = catalog
+        self.httpd.stats = Stats()
+        self.httpd.options = {"error_rate": error_rate, "latency": latency, "bandwidth": bandwidth}
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats(self):
+        return self.httpd.stats.snapshot()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-justice-gov", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def parseDatasets(value):
+    # "1:5,2:3" -> {1: 5, 2: 3}, dataset number and page count
+    return {int(d): int(p) for d, p in (part.split(":") for part in value.split(","))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the justice.gov Epstein file listings")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--datasets", default="1:5", help="dataset:pages pairs, e.g. 1:5,2:3")
+    parser.add_argument("--files-per-page", type=int, default=50)
+    parser.add_argument("--placeholder-rate", type=float, default=0.05)
+    parser.add_argument("--video-size", type=int, default=5_000_000)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 403/429/500")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--bandwidth", type=float, default=None, help="bytes per second per response")
+    args = parser.parse_args()
+
+    catalog = Catalog(parseDatasets(args.datasets), files_per_page=args.files_per_page,
+                      placeholder_rate=args.placeholder_rate, video_size=args.video_size)
+    server = FakeJusticeGov(catalog, port=args.port, error_rate=args.error_rate, latency=args.latency, bandwidth=args.bandwidth)
+    print(f"Serving {catalog.fileCount()} files at {server.url}, stats at {server.url}/__stats")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
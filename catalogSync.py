@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+import time
+
+import fileManifest
+
+
+## sync mode: re-list every dataset from page 0 and compare against the catalog in the manifest.
+## Unchanged pages come from the page cache (a 304 or the same body hash), so they cost one
+## conditional request and no parsing or queueing. New files are downloaded by the normal pool;
+## files that left the listings are flagged removed, and downloaded files on pages that changed
+## are checked with a HEAD for retraction (now a placeholder or a 404). The local copies are kept.
+
+REPORT_DIR = "logs"
+
+
+class SyncRun:
+
+    def __init__(self, datasets):
+        self.datasets = list(datasets)
+        self.started = time.time()
+        self.before = {dataset: fileManifest.catalog(dataset) for dataset in self.datasets}
+        self.seen = {dataset: {} for dataset in self.datasets}   # dataset -> {url: page}
+        self.changed_pages = {dataset: set() for dataset in self.datasets}
+        self.pages = {"listed": 0, "unchanged": 0, "changed": 0, "new": 0}
+        self.complete = set()  # datasets listed through to their last page
+        self._lock = threading.Lock()
+
+    def recordPage(self, dataset, page, urls, listing):
+
+        ## One consumed listing page. Returns the urls that need queueing: none for an unchanged
+        ## page, and never the unfinished files the run already re-queued from the manifest.
+
+        with self._lock:
+            seen = self.seen.setdefault(dataset, {})
+            for url in urls:
+                seen[url] = page
+
+            self.pages["listed"] += 1
+            if not listing.get("changed", True):
+                self.pages["unchanged"] += 1
+                return []
+            if listing.get("seen_before"):
+                self.pages["changed"] += 1
+                self.changed_pages.setdefault(dataset, set()).add(page)
+            else:
+                self.pages["new"] += 1
+
+            before = self.before.get(dataset, {})
+            requeued = (fileManifest.PENDING, fileManifest.FAILED)
+            return [url for url in urls if url not in before or before[url][1] not in requeued]
+
+    def datasetListed(self, dataset):
+        with self._lock:
+            self.complete.add(dataset)
+
+    def diff(self):
+
+        ## {added, removed, restored, moved} compared with the catalog before the run
+
+        added, removed, restored, moved = [], [], [], []
+        for dataset in self.datasets:
+            before = self.before.get(dataset, {})
+            seen = self.seen.get(dataset, {})
+
+            for url, page in seen.items():
+                if url not in before:
+                    added.append(url)
+                    continue
+                old_page, status = before[url]
+                if status == fileManifest.REMOVED:
+                    restored.append(url)
+                if old_page != page:
+                    moved.append((url, page))
+
+            # a listing cut short (access denied, interrupted) says nothing about removals
+            if dataset in self.complete:
+                removed.extend(url for url, (_, status) in before.items()
+                               if url not in seen and status != fileManifest.REMOVED)
+
+        return {"added": added, "removed": removed, "restored": restored, "moved": moved}
+
+    def retractionCandidates(self):
+
+        ## Files that were downloaded before and are still listed, on a page whose listing changed.
+        ## Files no longer listed are reported as removed, not checked again.
+
+        candidates = []
+        for dataset, pages in self.changed_pages.items():
+            seen = self.seen.get(dataset, {})
+            for url, (_, status) in self.before.get(dataset, {}).items():
+                if status == fileManifest.DONE and seen.get(url) in pages:
+                    candidates.append(url)
+        return candidates
+
+
+def checkRetractions(urls, head, is_placeholder_size):
+
+    ## HEAD each candidate, retracted when the server now answers 404 or with a placeholder
+
+    retracted = []
+    for url in urls:
+        try:
+            r = head(url)
+        except OSError:
+            continue  # requests' errors are OSErrors; unknown this run, checked again on the next sync
+        if r is None:
+            continue
+        if r.status_code == 404 or (r.status_code == 200 and is_placeholder_size(int(r.headers.get("Content-Length") or 0))):
+            retracted.append(url)
+    return retracted
+
+
+def finish(run, head=None, is_placeholder_size=None):
+
+    ## Apply the diff to the manifest and write logs/sync_report_<time>.json. Returns the report.
+
+    changes = run.diff()
+
+    retracted = []
+    if head is not None:
+        retracted = checkRetractions(run.retractionCandidates(), head, is_placeholder_size)
+
+    fileManifest.applySync(
+        removed=changes["removed"], restored=changes["restored"], moved=changes["moved"], retracted=retracted
+    )
+
+    report = {
+        "started": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run.started)),
+        "finished": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "datasets": run.datasets,
+        "pages": dict(run.pages),
+        "counts": {
+            "added": len(changes["added"]),
+            "removed": len(changes["removed"]),
+            "restored": len(changes["restored"]),
+            "moved": len(changes["moved"]),
+            "retracted": len(retracted),
+        },
+        "added": changes["added"],
+        "removed": changes["removed"],
+        "restored": changes["restored"],
+        "moved": [{"url": url, "page": page} for url, page in changes["moved"]],
+        "retracted": retracted,
+    }
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    path = os.path.join(REPORT_DIR, f"sync_report_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    report["path"] = path
+
+    return report
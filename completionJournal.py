@@ -0,0 +1,76 @@
+import json
+import os
+import time
+
+
+## Append-only record of every finished file (url and outcome), written ahead of the batched
+## manifest updates. Records reach the OS on every append and are fsynced in groups, so a crash
+## between two manifest batches no longer forgets finished downloads: the journal is replayed
+## into the manifest on the next start, and only files that really never finished are queued
+## again. Once a batch is committed to the manifest its records are compacted away.
+
+SYNC_RECORDS = 256   # fsync after this many records...
+SYNC_SECONDS = 1.0   # ...or this long after the last fsync, whichever comes first
+
+
+class CompletionJournal:
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def replay(self):
+
+        ## [(url, update)] in the order they were written. A torn last line from a crash is skipped.
+
+        records = []
+        if not os.path.exists(self.path):
+            return records
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    records.append((record["url"], record["update"]))
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return records
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def append(self, url, update):
+        f = self._open()
+        f.write(json.dumps({"url": url, "update": update}) + "\n")
+        f.flush()  # in the OS page cache now, survives the process dying
+
+        self._unsynced += 1
+        if self._unsynced >= SYNC_RECORDS or time.monotonic() - self._last_sync >= SYNC_SECONDS:
+            self.sync()
+
+    def sync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def compact(self):
+
+        ## Every record so far is committed to the manifest, start the journal over
+
+        if self._file is not None:
+            self._file.truncate(0)
+            self._file.seek(0)
+            self._unsynced = 0
+        elif os.path.exists(self.path):
+            open(self.path, "w").close()
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
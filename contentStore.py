@@ -0,0 +1,75 @@
+import hashlib
+import os
+import zipfile
+import fileManifest
+import storageLayout
+
+
+## Content-addressed bookkeeping for downloaded files. Every file is hashed while it streams,
+## the first copy of each SHA-256 is registered as the blob, and later files with the same
+## bytes are replaced by a hardlink to it (or kept as a recorded reference where the
+## filesystem cannot link).
+
+
+def newHasher(part_path=None):
+
+    ## SHA-256 seeded with the bytes already in a .part file, so a resumed transfer
+    ## ends with the hash of the whole file
+
+    h = hashlib.sha256()
+    if part_path and os.path.exists(part_path):
+        with open(part_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h
+
+
+def hashFile(path):
+    return newHasher(path).hexdigest()
+
+
+def storeOnce(url, path, sha256, size):
+
+    ## Register a finished file. If the same content is already stored under another
+    ## EFTA path, link this path to that copy instead of keeping a second one.
+    ## Returns True when path now shares storage with an earlier file.
+
+    existing = fileManifest.blobPath(sha256)
+
+    if existing is None or existing == path or not os.path.exists(existing) or os.path.getsize(existing) != size:
+        fileManifest.recordBlob(sha256, path, size)
+        return False
+
+    if os.path.samefile(existing, path):
+        return True
+
+    tmp = path + ".link"
+    try:
+        os.link(existing, tmp)
+        os.replace(tmp, path)
+    except OSError:
+        # cross-device or no hardlink support: keep the copy, the manifest still records the reference
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        fileManifest.addBlobReference(sha256)
+        return False
+
+    fileManifest.addBlobReference(sha256)
+    return True
+
+
+def verify(url, path):
+
+    ## Hash comparison against the manifest, True when the local file has the recorded content
+
+    entry = fileManifest.lookup(url)
+    if entry is None or not entry.get("sha256"):
+        return False
+    try:
+        with storageLayout.openFile(url, path) as f:  # the copy may be packed into an archive
+            h = hashlib.sha256()
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return h.hexdigest() == entry["sha256"]
+    except (OSError, zipfile.BadZipFile):
+        return False
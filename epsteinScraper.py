@@ -1,76 +1,215 @@
+import argparse
+import hashlib
 import json
+import os
 import random
+import sys
 import threading
-from anaconda_cli_base import console
-import requests
-import os
-import yaml
 import time
-from bs4 import BeautifulSoup
-import poolDownloader
+from concurrent.futures import ThreadPoolExecutor
+
+import fileManifest
+import logWriter
+import metrics
+import pageCache
+import shardLeases
+import storageLayout
+
+
+## Importable entry point of the scraper. Nothing runs at import time: loadConfig reads (and
+## completes) config.yaml, a Scraper built from that config opens the manifest and starts the
+## download pool only when one of crawl/sync/fetch/verify/status is called. requests, Rich,
+## aiohttp and lxml are imported by the stages that use them, so `status` never loads them.
+##
+##     with Scraper(loadConfig()) as scraper:
+##         scraper.crawl()
+##
+## The download pool, rate limiter and manifest are module-level, so one Scraper runs per process.
+
+CONFIG_FILE = "config.yaml"
+COMMANDS = ("crawl", "fetch", "sync", "verify", "status", "migrate", "pack", "coordinate")
+
+
+def resolveConfig(config=None):
+
+    ## Every setting with its default filled in, from a (possibly partial) config dict
+
+    config = config or {}
+
+    directory = config.get("directory", os.getcwd())
+    timeBetweenPages = float(config.get("timeBetweenPages", 40))
+    timeBetweenFiles = float(config.get("timeBetweenFiles", 40))
+    fetchRetries = int(config.get("fetchRetries", 25))
+    downloadRetries = int(config.get("downloadRetries", 3))
+    timeBetween403 = float(config.get("timeBetween403", 4000))
+    datasets = config.get("datasets", [1])
+    downloadWorkers = int(config.get("downloadWorkers", 8))
+    pageFetchConcurrency = max(1, int(config.get("pageFetchConcurrency", 1)))
+    datasetConcurrency = max(1, int(config.get("datasetConcurrency", 1)))
+    probeWorkers = int(config.get("probeWorkers", 2))
+    timeBetweenProbes = float(config.get("timeBetweenProbes", timeBetweenFiles))
+    poolSize = int(config.get("poolSize", 600))
+    trustLocalFiles = config.get("trustLocalFiles",False)
+    verifyHashes = config.get("verifyHashes", False)
+    adaptiveRateLimit = config.get("adaptiveRateLimit", True)
+    requestsPerSecond = float(config.get("requestsPerSecond", 4))
+    minRequestsPerSecond = float(config.get("minRequestsPerSecond", 0.2))
+    maxRequestsPerSecond = float(config.get("maxRequestsPerSecond", 10))
+    cacheListingPages = config.get("cacheListingPages", True)
+    downloadEngine = config.get("downloadEngine", "threads")  # "threads" or "asyncio"
+    asyncConcurrency = int(config.get("asyncConcurrency", 200))
+    manifestPath = config.get("manifestPath", fileManifest.MANIFEST_FILE)
+    shardMode = config.get("shardMode", False)
+    shardId = config.get("shardId", "")  # empty: hostname-pid
+    shardPages = int(config.get("shardPages", 50))
+    leaseSeconds = float(config.get("leaseSeconds", 300))
+    shardCoordinator = config.get("shardCoordinator", "")  # lease coordinator URL for shards on several hosts, empty: shared manifest
+    coordinatorHost = config.get("coordinatorHost", "127.0.0.1")  # where `coordinate` listens, 0.0.0.0 for shards on other hosts
+    coordinatorPort = int(config.get("coordinatorPort", 8765))
+    coordinatorToken = config.get("coordinatorToken", "")  # shared secret shards send to the coordinator
+    metricsPort = int(config.get("metricsPort", 0))  # 0 disables the Prometheus endpoint
+    metricsHost = config.get("metricsHost", "127.0.0.1")  # bind address, 0.0.0.0 exposes the unauthenticated endpoint to the network
+    metricsSnapshotSeconds = float(config.get("metricsSnapshotSeconds", 60))  # 0 disables logs/metrics.json
+    logMaxBytes = int(config.get("logMaxBytes", logWriter.MAX_BYTES))  # rotate a log file past this size
+    logBackups = int(config.get("logBackups", logWriter.BACKUPS))
+    structuredLogs = config.get("structuredLogs", True)  # JSONL next to each text log
+    headless = config.get("headless", "auto")  # true, false, or "auto": headless when stdout is not a terminal
+    statusInterval = float(config.get("statusInterval", 30))  # seconds between headless status lines
+    statusFormat = config.get("statusFormat", "text")  # "text" or "json"
+    verifyWorkers = int(config.get("verifyWorkers", os.cpu_count() or 1))
+    syncCheckRetractions = config.get("syncCheckRetractions", True)  # HEAD downloaded files on changed pages during sync
+    baseUrl = config.get("baseUrl", "https://www.justice.gov").rstrip("/")  # override to run against a local stand-in, see benchmarks/
+    spillQueue = config.get("spillQueue", False)  # keep the pool on disk, poolSize items in memory
+    spillQueuePath = config.get("spillQueuePath", "pool_queue.db")
+    spillQueueLimit = int(config.get("spillQueueLimit", 0))  # most files queued on disk before discovery waits, 0: no limit
+    connectionPoolSize = int(config.get("connectionPoolSize", 0))  # 0: one connection per thread sharing the session
+    http2 = config.get("http2", False)  # multiplex requests over a few HTTP/2 connections, needs httpx and h2
+    postProcessWorkers = int(config.get("postProcessWorkers", max(1, (os.cpu_count() or 2) // 2)))
+    postProcessStages = config.get("postProcessStages", ["pdf", "mime", "hash"])  # checks on finished files, [] disables them
+    storageLayoutName = config.get("storageLayout", "flat")  # flat, sharded (by EFTA number) or packed (small files zipped per shard)
+    storageBucketSize = int(config.get("storageBucketSize", 1000))  # EFTA numbers per shard directory
+    packMaxBytes = int(config.get("packMaxBytes", 1024 * 1024))  # packed: largest file moved into an archive
+
+    return {
+        "directory": directory,
+        "timeBetweenPages": timeBetweenPages,
+        "timeBetweenFiles": timeBetweenFiles,
+        "fetchRetries": fetchRetries,
+        "downloadRetries": downloadRetries,
+        "timeBetween403": timeBetween403,
+        "datasets": datasets,
+        "downloadWorkers": downloadWorkers,
+        "pageFetchConcurrency": pageFetchConcurrency,
+        "datasetConcurrency": datasetConcurrency,
+        "probeWorkers": probeWorkers,
+        "timeBetweenProbes": timeBetweenProbes,
+        "poolSize": poolSize,
+        "trustLocalFiles": trustLocalFiles,
+        "verifyHashes": verifyHashes,
+        "adaptiveRateLimit": adaptiveRateLimit,
+        "requestsPerSecond": requestsPerSecond,
+        "minRequestsPerSecond": minRequestsPerSecond,
+        "maxRequestsPerSecond": maxRequestsPerSecond,
+        "cacheListingPages": cacheListingPages,
+        "downloadEngine": downloadEngine,
+        "asyncConcurrency": asyncConcurrency,
+        "manifestPath": manifestPath,
+        "shardMode": shardMode,
+        "shardId": shardId,
+        "shardPages": shardPages,
+        "leaseSeconds": leaseSeconds,
+        "shardCoordinator": shardCoordinator,
+        "coordinatorHost": coordinatorHost,
+        "coordinatorPort": coordinatorPort,
+        "coordinatorToken": coordinatorToken,
+        "metricsPort": metricsPort,
+        "metricsHost": metricsHost,
+        "metricsSnapshotSeconds": metricsSnapshotSeconds,
+        "logMaxBytes": logMaxBytes,
+        "logBackups": logBackups,
+        "structuredLogs": structuredLogs,
+        "headless": headless,
+        "statusInterval": statusInterval,
+        "statusFormat": statusFormat,
+        "verifyWorkers": verifyWorkers,
+        "syncCheckRetractions": syncCheckRetractions,
+        "baseUrl": baseUrl,
+        "spillQueue": spillQueue,
+        "spillQueuePath": spillQueuePath,
+        "spillQueueLimit": spillQueueLimit,
+        "connectionPoolSize": connectionPoolSize,
+        "http2": http2,
+        "postProcessWorkers": postProcessWorkers,
+        "postProcessStages": postProcessStages,
+        "storageLayout": storageLayoutName,
+        "storageBucketSize": storageBucketSize,
+        "packMaxBytes": packMaxBytes
+    }
+
+
+def loadConfig(path=CONFIG_FILE, write_back=True):
+
+    ## Read the yaml config, falling back to the defaults if it is missing or fails to load.
+    ## write_back adds any missing options to the file while preserving the existing ones.
+
+    import yaml
+
+    config = {}
+    try:
+        with open(path) as f:
+            config = yaml.safe_load(f) or {}
+    except Exception:
+        print(f"Error loading {path}, using default configuration.")
+
+    data = resolveConfig(config)
+
+    if write_back:
+        try:
+            with open(path, 'w') as file:
+                yaml.dump(data, file)
+        except Exception:
+            print(f"file exception when writing {path}")
+
+    return data
 
-datasetPattern = "https://www.justice.gov/epstein/doj-disclosures/data-set-{}-files"
-filePattern = "https://www.justice.gov/epstein/files/DataSet%20{}/{}"
 
-generating_files = None
+def connectionCount(config):
 
+    ## Threads that can have a request in flight on the shared session at once
 
-# setup code
+    if config["connectionPoolSize"] > 0:
+        return config["connectionPoolSize"]
+    return (config["downloadWorkers"] + config["probeWorkers"]
+            + config["pageFetchConcurrency"] * config["datasetConcurrency"] + 1)
 
-config = {}
 
-try:
-    config = yaml.safe_load(open("config.yaml"))  # load config from yaml file, or create default if it doesn't exist or fails to load
-except Exception:
-    print("Error loading config.yaml, using default configuration.")
+def newSession(baseUrl, connections=10, http2=False):
 
-directory = config.get("directory", os.getcwd())
-timeBetweenPages = float(config.get("timeBetweenPages", 40))
-timeBetweenFiles = float(config.get("timeBetweenFiles", 40))
-fetchRetries = int(config.get("fetchRetries", 25))
-timeBetween403 = float(config.get("timeBetween403", 4000))
-datasets = config.get("datasets", [1])
-downloadWorkers = int(config.get("downloadWorkers", 8))
-poolSize = int(config.get("poolSize", 600))
-trustLocalFiles = config.get("trustLocalFiles",False)
+    ## Persistent session to improve network traffic, every request goes through the rate limiter.
+    ## Its connection pool holds `connections`, so no thread's connection is discarded after use.
 
-data = {
-    "directory": directory,
-    "timeBetweenPages": timeBetweenPages,
-    "timeBetweenFiles": timeBetweenFiles,
-    "fetchRetries": fetchRetries,
-    "timeBetween403": timeBetween403,
-    "datasets": datasets,
-    "downloadWorkers": downloadWorkers,
-    "poolSize": poolSize,
-    "trustLocalFiles": trustLocalFiles
-}
+    import requests
+    import rateLimiter
+    import transport
 
-os.makedirs(directory, exist_ok=True)
+    s = rateLimiter.LimitedSession()
 
-with open('config.yaml','w') as file:
-    yaml.dump(data, file)     ## roundabout way of adding any missing config options to the yaml file while preserving existing ones
-try: 
-    config = yaml.safe_load(open("config.yaml"))
-except Exception: 
-    print("file exception when handling config")
-    os._exit()
+    if transport.mount(s, connections, http2) != transport.HTTP2 and http2:
+        print("http2 needs the httpx and h2 packages, using HTTP/1.1.")
 
+    s.headers.update({ ## Simulating a browser to increase authenticity of requests, reducing scraper detection
 
-# set up a persistent session to improve network traffic
-s = requests.Session()
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:147.0) Gecko/20100101 Firefox/147.0",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+        "Accept-Language": "en-US,en;q=0.9",
 
-s.headers.update({ ## Simulating a browser to increase authenticity of requests, reducing scraper detection
-    
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:147.0) Gecko/20100101 Firefox/147.0",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-    "Accept-Language": "en-US,en;q=0.9",
-    
-})
+    })
 
-# create a justiceGovAgeVerified cookie that is set to true to bypass age verification
-verificationCookie = requests.cookies.create_cookie("justiceGovAgeVerified", "true", domain = "www.justice.gov")
-s.cookies.set_cookie(verificationCookie)
+    # create a justiceGovAgeVerified cookie that is set to true to bypass age verification
+    verificationCookie = requests.cookies.create_cookie("justiceGovAgeVerified", "true", domain = requests.utils.urlparse(baseUrl).hostname)
+    s.cookies.set_cookie(verificationCookie)
+
+    return s
 
 
 #---------------#
@@ -82,51 +221,64 @@ def randomDelay(delay):
 
 
 
-# State management for resume functionality
+# State management for resume functionality, backed by the file manifest
 
-STATE_FILE = "scraper_state.json"
+STATE_FILE = "scraper_state.json"  # legacy (dataset, page) state, only read to migrate old runs
 
-def load_state():
-    """Load the last known state (dataset and page)"""
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, "r") as f:
-                data = json.load(f, parse_int=lambda x: int(x) if x.isdigit() else x)
-                return data
-        except Exception:
-            pass
-    return {"last_dataset": None, "last_page": None}  # default state if no file or error
+def load_state(datasets):
+    """Load the crawl position of every dataset as {dataset: (last_page, finished)}"""
+    positions = fileManifest.crawlPositions()
+    if positions or not os.path.exists(STATE_FILE):
+        return positions
 
-def save_state(location):
+    # migrate a scraper_state.json from an older run: datasets before the saved one are done,
+    # and the saved page is crawled again since its files may not have finished
+    try:
+        with open(STATE_FILE, "r") as f:
+            data = json.load(f, parse_int=lambda x: int(x) if x.isdigit() else x)
+        last_dataset = int(data.get("last_dataset"))
+        last_page = int(data.get("last_page"))
+    except Exception:
+        return positions
+
+    if last_dataset in datasets:
+        for dataset in datasets[:datasets.index(last_dataset)]:
+            fileManifest.saveCrawlPosition(dataset, None, finished=True)
+        fileManifest.saveCrawlPosition(last_dataset, last_page - 1)
 
-    dataset_num = location[0]
-    page_num = location[1]
+    return fileManifest.crawlPositions()
 
+def save_state(dataset_num, page_num, finished=False):
     try:
-        with open(STATE_FILE, "w") as f:
-            json.dump({
-                "last_dataset": dataset_num,
-                "last_page": page_num,
-            }, f)
+        fileManifest.saveCrawlPosition(dataset_num, page_num, finished)
     except Exception:
         pass
 
-def reset_state():
+def reset_state(manifestPath=fileManifest.MANIFEST_FILE, queuePath="pool_queue.db"):
     """Clear the saved state"""
-    if os.path.exists(STATE_FILE):
-        try:
-            os.remove(STATE_FILE)
-        except Exception:
-            pass
+    fileManifest.close()
+    for path in (STATE_FILE, manifestPath, manifestPath + "-wal", manifestPath + "-shm", fileManifest.journalPath(manifestPath),
+                 queuePath, queuePath + "-wal", queuePath + "-shm"):
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except Exception:
+                pass
 
 #---------------#
 
 
-def fetch_with_retry(url, session, retries=5, delay=3, timeBetween403 = 4):
+def fetch_with_retry(url, session, retries=5, delay=3, timeBetween403 = 4, headers=None, stop=None):
+
+    import poolDownloader
+    import rateLimiter
 
     for attempt in range(retries):
+        if stop is not None and stop.is_set():
+            return None
+
         try:
-            r = session.get(url, timeout=10)
+            r = session.get(url, timeout=10, headers=headers)
         except Exception:
             r = None
 
@@ -134,6 +286,9 @@ def fetch_with_retry(url, session, retries=5, delay=3, timeBetween403 = 4):
             randomDelay(delay + ((delay*0.5) * attempt))  # increase delay with each retry
             continue
 
+        if r.status_code == 304 and headers:  # conditional request, cached copy is still current
+            return r
+
         if r.status_code == 200:
             if b"EFTA" in r.content or b"ReportLab" in r.content or len(r.content) > 200:
                 return r
@@ -143,7 +298,8 @@ def fetch_with_retry(url, session, retries=5, delay=3, timeBetween403 = 4):
 
         if r.status_code in (403, 429, 500, 502, 503):
             poolDownloader.incrementForbiddenCount()
-            randomDelay(timeBetween403 + ((timeBetween403*0.5) * attempt))  # increase delay with each retry
+            if not rateLimiter.active() or r.status_code not in rateLimiter.THROTTLE_STATUSES:  # the limiter already paused every thread
+                randomDelay(timeBetween403 + ((timeBetween403*0.5) * attempt))  # increase delay with each retry
             continue
 
     return None
@@ -153,203 +309,713 @@ def fetch_with_retry(url, session, retries=5, delay=3, timeBetween403 = 4):
 
 
 
-def updatePool(dataset_num, start_page=0):
-    page = start_page
+def parseListing(html):
+    # file list and page flags in one pass, see linkExtractor
+    import linkExtractor
+    return linkExtractor.extract(html)
 
-    final_page = False
 
-    while True:
+def _log(message, **fields):
+    # the same line in both logs, like every crawl milestone
+    import poolDownloader
+    poolDownloader.log_event(poolDownloader.failed_log, message, **fields)
+    poolDownloader.log_event(poolDownloader.alt_log, message, **fields)
 
-        if poolDownloader.poolSize() > poolSize:
-            time.sleep(0.2)
-            continue
 
-        requested_url = f"{datasetPattern.format(dataset_num)}?page={page}"
-        r = fetch_with_retry(requested_url, s, retries=fetchRetries, delay=timeBetweenPages, timeBetween403=timeBetween403)
+class Downloader:
 
-        if r is None:
-            poolDownloader.incrementErrorCount()
-            continue
+    ## Download side of the pipeline: the worker threads (or the asyncio engine) draining the
+    ## shared pool, started on a thread of its own so discovery can keep filling the pool.
 
-        soup = BeautifulSoup(r.text, "html.parser")
+    def __init__(self, config, session):
+        self.config = config
+        self.session = session
+        self.workers = config["downloadWorkers"]
+        self._thread = None
 
-        # --- Extract files ---
-        page_files = sorted({
-            a["href"].split("/")[-1]
-            for a in soup.find_all("a", href=True)
-            if "/epstein/files/" in a["href"] and "EFTA" in a["href"]
-        })
-        # Log inaccessible no-pagination and access denied pages
-        pagination = soup.find(class_="usa-pagination")
-        access_denied = soup.find(title_="Access Denied")
-        generating_files = soup.find_all('link', href= "list%20still%20generating_files/slick.css")
+    def start(self):
+        import poolDownloader
+        import postProcess
 
-        if access_denied:
-            poolDownloader.log_event(
-                poolDownloader.failed_log,
-                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Access denied at https://www.justice.gov/epstein/doj-disclosures/data-set-{dataset_num}-files?page={page}"
+        config = self.config
+
+        postProcess.start(config["postProcessWorkers"], config["postProcessStages"],
+                          log=lambda message, **fields: poolDownloader.log_event(poolDownloader.failed_log, message, **fields))
+
+        kwargs = {"downloadRetries": config["downloadRetries"], "probeWorkers": config["probeWorkers"],
+                  "timeBetweenProbes": config["timeBetweenProbes"], "verifyHashes": config["verifyHashes"]}
+
+        engine = config["downloadEngine"]
+        if engine == "asyncio":
+            import asyncDownloader
+            if not asyncDownloader.available():
+                print("downloadEngine 'asyncio' needs the aiohttp package, falling back to threads.")
+                engine = "threads"
+
+        if engine == "asyncio":
+            self._thread = threading.Thread(
+                target=asyncDownloader.downloadFromPoolAsync,
+                args=(config["directory"], config["asyncConcurrency"], self.workers, config["timeBetweenFiles"], self.session, config["trustLocalFiles"]),
+                kwargs=kwargs,
             )
+        else:
+            self._thread = threading.Thread(
+                target=poolDownloader.downloadFromPool,
+                args=(config["directory"], self.workers, config["timeBetweenFiles"], self.session, config["trustLocalFiles"]),
+                kwargs=kwargs,
+            )
+        self._thread.start()
+        return self
+
+    def queue(self, pool_objects):
+        import poolDownloader
+        poolDownloader.updatePool(pool_objects)
+
+    def probe(self, pool_objects):
+        import poolDownloader
+        for poolObject in pool_objects:
+            poolDownloader.queueProbe(poolObject)
+
+    def finish(self):
+        # discovery is done, let the workers finish everything still queued, then the checks
+        import poolDownloader
+        import postProcess
+        poolDownloader.finish_pool()
+        postProcess.drain()
+
+    def cancel(self):
+        import poolDownloader
+        poolDownloader.signalStart()
+        poolDownloader.empty_pool(self.workers)
+        poolDownloader.producerDone()
+
+    def close(self):
+        import poolDownloader
+        import postProcess
+        poolDownloader.empty_pool(self.workers)
+        postProcess.stop()
+
+
+class Scraper:
+
+    ## Discovery side of the pipeline plus the commands built on it. Construct it with a config
+    ## dict (loadConfig(), or any partial dict for resolveConfig) and optionally a session of
+    ## your own; use it as a context manager, or call close() when done.
+
+    def __init__(self, config=None, session=None):
+        self.config = resolveConfig(config)
+        config = self.config
+
+        self.datasets = config["datasets"]
+        self.timeBetweenPages = config["timeBetweenPages"]
+        self.timeBetween403 = config["timeBetween403"]
+        self.fetchRetries = config["fetchRetries"]
+        self.pageFetchConcurrency = config["pageFetchConcurrency"]
+        self.datasetConcurrency = config["datasetConcurrency"]
+        self.poolSize = config["poolSize"]
+        self.cacheListingPages = config["cacheListingPages"]
+        self.manifestPath = config["manifestPath"]
+        self.shardMode = config["shardMode"]
+        self.leaseSeconds = config["leaseSeconds"]
+
+        storageLayout.configure(config["storageLayout"], config["storageBucketSize"])
+
+        self.datasetPattern = config["baseUrl"] + "/epstein/doj-disclosures/data-set-{}-files"
+        self.filePattern = config["baseUrl"] + "/epstein/files/DataSet%20{}/{}"
+
+        self.session = session
+        self.downloader = None
+        self.shardName = (config["shardId"] or shardLeases.defaultShardId()) if self.shardMode else None
+        self.sync_run = None  # catalogSync.SyncRun while syncing
+
+        self._page_fetchers = None
+        self._stop_crawl = threading.Event()
+        self._manifest_open = False
+        self._services = False
+
+    #---------------#
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def openManifest(self):
+        if not self._manifest_open:
+            # with a coordinator every shard keeps a manifest of its own
+            fileManifest.open_manifest(self.manifestPath, shared=self.shardMode and not self.config["shardCoordinator"],
+                                       journal_path=fileManifest.journalPath(self.manifestPath, self.shardName))
+            self._manifest_open = True
+
+    def _migrateLayout(self):
+
+        ## Move a tree written with another layout to the configured one before anything looks for
+        ## files in it, so switching layouts never re-downloads (or re-queues) what is already there
+
+        directory = self.config["directory"]
+        if not storageLayout.needsMigration(directory, self.datasets):
+            return 0
+
+        self._configureLogs()
+        self.openManifest()
+        moved = storageLayout.migrate(directory, self.datasets)
+        self._writeLog(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Moved {moved} files to the {storageLayout.layout()} layout",
+                       event="migrated", count=moved)
+        return moved
+
+    def _configureLogs(self):
+        config = self.config
+        os.makedirs("logs", exist_ok=True)
+        logWriter.configure(max_bytes=config["logMaxBytes"], backups=config["logBackups"], structured=config["structuredLogs"])
+
+    def _writeLog(self, message, **fields):
+        # for the offline commands, which never load the download pool
+        logWriter.write(os.path.join("logs", "failed_downloads.log"), message, **fields)
+
+    def _startServices(self):
+
+        ## Process-wide setup for the commands that talk to the server
+
+        if self._services:
+            return
+        self._services = True
+
+        import poolDownloader
+        import rateLimiter
+
+        config = self.config
+        os.makedirs(config["directory"], exist_ok=True)
+
+        # one token bucket for every request to justice.gov, backing off on 403/429/503
+        rateLimiter.configure(
+            enabled=config["adaptiveRateLimit"],
+            rate=config["requestsPerSecond"],
+            min_rate=config["minRequestsPerSecond"],
+            max_rate=config["maxRequestsPerSecond"],
+            penalty=self.timeBetween403 / 1000,
+        )
+
+        self._configureLogs()
+
+        headless = config["headless"]
+        poolDownloader.setDisplay(
+            headless=not sys.stdout.isatty() if headless == "auto" else bool(headless),
+            status_interval=config["statusInterval"],
+            status_format=config["statusFormat"],
+        )
+
+        if config["metricsPort"]:
+            metrics.serve(config["metricsPort"], config["metricsHost"])
+        if config["metricsSnapshotSeconds"] > 0:
+            metrics.startSnapshots(config["metricsSnapshotSeconds"])
+
+        if self.session is None:
+            self.session = newSession(config["baseUrl"], connectionCount(config), config["http2"])
+
+        # poolSize bounds the download pool, discovery blocks while it is full. With the spill queue
+        # it only bounds what is held in memory, and the queue left by the last run is resumed.
+        recovered = 0
+        if config["spillQueue"]:
+            import spillQueue
+            recovered = poolDownloader.useSpillQueue(spillQueue.queuePath(config["spillQueuePath"], self.shardName),
+                                                     self.poolSize, config["spillQueueLimit"])
+        else:
+            poolDownloader.setPoolLimit(self.poolSize)
+
+        self.openManifest()
+        self._migrateLayout()
+
+        if self.shardMode:
+            shardLeases.start(self.shardName, config["shardPages"], self.leaseSeconds,
+                              coordinator=config["shardCoordinator"], token=config["coordinatorToken"])
+
+        self.downloader = Downloader(config, self.session).start()
 
+        if recovered:
+            _log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Resuming {recovered} queued files from the spill queue")
             poolDownloader.signalStart()
-            poolDownloader.empty_pool(downloadWorkers)
-            poolDownloader.producerDone()
 
-        if generating_files:
+    def close(self):
+        if self.downloader is not None:
+            import poolDownloader
 
-            poolDownloader.log_event(
-                poolDownloader.failed_log,
-                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Generating files redirect at https://www.justice.gov/epstein/doj-disclosures/data-set-{dataset_num}-files?page={page}"
-            )
+            self.downloader.close()
 
-            randomDelay(timeBetween403)
-            continue
+            lastLocation = poolDownloader.getLastLocation()
+            _log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Log closed, scraper exiting at Dataset {lastLocation[0]}, Page {lastLocation[1]}")
+            self.downloader = None
 
+        if self._services:
+            import poolDownloader
+            poolDownloader.releasePool()
 
-        if not pagination and len(page_files) > 40:
+        logWriter.close()
 
-            poolDownloader.log_event(
-                poolDownloader.failed_log,
-                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | "
-                f"Dataset {dataset_num} | Page {page} | "
-                f"No pagination, inaccessible page | {requested_url}"
-            )
-            page += 1
-            continue
+        if self._services and self.shardMode:
+            shardLeases.stop()
+
+        metrics.stop()
+        fileManifest.close()
+        pageCache.close()
+        self._manifest_open = False
+        self._services = False
+
+    #---------------#
 
-        if(pagination):
-            aria_next = pagination.find("a", attrs={"aria-label": "Next page"}) 
+    def fetchListing(self, dataset_num, page, requested_url):
 
-            if not (aria_next): # theoretically the end of the dataset should have no "next" button
+        ## Fetch and parse one listing page, reusing the cached file list when the page has not changed.
+        ## "changed" tells whether the page differs from the cached copy, "seen_before" whether there was one.
+
+        cached = pageCache.lookup(dataset_num, page) if self.cacheListingPages else None
+
+        with metrics.page_fetch_seconds.time():
+            r = fetch_with_retry(requested_url, self.session, retries=self.fetchRetries, delay=self.timeBetweenPages,
+                                 timeBetween403=self.timeBetween403, headers=pageCache.conditionalHeaders(cached), stop=self._stop_crawl)
+
+        if r is None:
+            metrics.pages.inc(labels={"result": "failed"})
+            return None
+
+        if r.status_code == 304:
+            metrics.pages.inc(labels={"result": "not_modified"})
+            pageCache.touch(dataset_num, page)
+            return dict(cached["listing"], changed=False, seen_before=True)
+
+        content_hash = hashlib.sha256(r.content).hexdigest()
+
+        if cached is not None and cached["content_hash"] == content_hash:
+            metrics.pages.inc(labels={"result": "unchanged"})
+            pageCache.touch(dataset_num, page)
+            return dict(cached["listing"], changed=False, seen_before=True)
+
+        with metrics.page_parse_seconds.time():
+            listing = parseListing(r.text)
+        metrics.pages.inc(labels={"result": "parsed"})
+
+        if self.cacheListingPages and not (listing["access_denied"] or listing["generating_files"]):
+            pageCache.store(dataset_num, page, r, content_hash, listing)
+
+        return dict(listing, changed=True, seen_before=cached is not None)
+
+
+    # Discovery stage: page fetches run on a shared pool so several pages (and datasets) can be in
+    # flight at once, while each dataset still consumes its pages strictly in order
+
+    def _fetchPage(self, dataset_num, page, requested_url):
+        import rateLimiter
+        if self.pageFetchConcurrency > 1 and not rateLimiter.active():
+            randomDelay(self.timeBetweenPages)  # each fetcher paces itself like the sequential crawl did
+        return self.fetchListing(dataset_num, page, requested_url)
+
+    def _submitPage(self, dataset_num, page):
+        if self._page_fetchers is None:
+            self._page_fetchers = ThreadPoolExecutor(max_workers=self.pageFetchConcurrency, thread_name_prefix="page-fetch")
+        requested_url = f"{self.datasetPattern.format(dataset_num)}?page={page}"
+        return self._page_fetchers.submit(self._fetchPage, dataset_num, page, requested_url)
+
+    def stop(self):
+
+        ## Stop discovery and drop whatever is still queued, e.g. on Ctrl+C
+
+        self._stop_crawl.set()
+        if self._page_fetchers is not None:
+            self._page_fetchers.shutdown(wait=False, cancel_futures=True)
+        if self.downloader is not None:
+            self.downloader.cancel()
+
+
+    def updatePool(self, dataset_num, start_page=0, end_page=None):
+
+        ## end_page bounds the crawl to a leased page range in shard mode
+
+        import poolDownloader
+
+        page = start_page
+
+        final_page = False
+
+        in_flight = {}  # page -> future, up to pageFetchConcurrency pages ahead of the one being consumed
+
+        while not self._stop_crawl.is_set():
+
+            if end_page is not None and page > end_page:
+                break
+
+            last_ahead = page + self.pageFetchConcurrency if end_page is None else min(page + self.pageFetchConcurrency, end_page + 1)
+            for ahead in range(page, last_ahead):
+                if ahead not in in_flight:
+                    in_flight[ahead] = self._submitPage(dataset_num, ahead)
+
+            requested_url = f"{self.datasetPattern.format(dataset_num)}?page={page}"
+            try:
+                listing = in_flight.pop(page).result()
+            except Exception:
+                listing = None
+
+            if listing is None:
+                poolDownloader.incrementErrorCount()
+                continue
+
+            page_files = listing["files"]
+
+            # Log inaccessible no-pagination and access denied pages
+            if listing["access_denied"]:
+                poolDownloader.log_event(
+                    poolDownloader.failed_log,
+                    f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Access denied at {requested_url}",
+                    event="access_denied", dataset=dataset_num, page=page, url=requested_url
+                )
+
+                self.downloader.cancel()
+
+            if listing["generating_files"]:
+
+                poolDownloader.log_event(
+                    poolDownloader.failed_log,
+                    f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Generating files redirect at {requested_url}",
+                    event="generating_files", dataset=dataset_num, page=page, url=requested_url
+                )
+
+                randomDelay(self.timeBetween403)
+                continue
+
+
+            if not listing["pagination"] and len(page_files) > 40:
+
+                poolDownloader.log_event(
+                    poolDownloader.failed_log,
+                    f"{time.strftime('%Y-%m-%d %H:%M:%S')} | "
+                    f"Dataset {dataset_num} | Page {page} | "
+                    f"No pagination, inaccessible page | {requested_url}",
+                    event="no_pagination", dataset=dataset_num, page=page, url=requested_url, files=len(page_files)
+                )
+                page += 1
+                continue
+
+            if listing["pagination"] and not listing["has_next"]: # theoretically the end of the dataset should have no "next" button
 
                 final_page = True
 
-        if( 1 <= len(page_files) < 40): #this is specifically to handle dataset 6 and 7
-                
-            final_page = True
-        
+            if( 1 <= len(page_files) < 40): #this is specifically to handle dataset 6 and 7
 
-        # --- Queue files ---
-        pool_objects = [
-            ( dataset_num, page, filePattern.format(dataset_num, filename))
-            for filename in page_files
-        ]
+                final_page = True
 
-        poolDownloader.updatePool(pool_objects)
-        poolDownloader.setDatasetInfo(dataset_num, page)
 
-        if poolDownloader.poolSize() >= poolSize:
-            poolDownloader.signalStart()
+            # --- Queue files ---
+            pool_objects = [
+                ( dataset_num, page, self.filePattern.format(dataset_num, filename))
+                for filename in page_files
+            ]
 
-        if(poolDownloader.isStarted()):
-            save_state(poolDownloader.getLastLocation())
+            # sync mode only queues pages that changed since the last crawl
+            if self.sync_run is not None:
+                wanted = set(self.sync_run.recordPage(dataset_num, page, [obj[2] for obj in pool_objects], listing))
+                pool_objects = [obj for obj in pool_objects if obj[2] in wanted]
 
-        if(final_page): 
+            if pool_objects:
+                self.downloader.queue(pool_objects)
+            poolDownloader.setDatasetInfo(dataset_num, page)
 
+            if poolDownloader.poolSize() >= self.poolSize:
+                poolDownloader.signalStart()
+
+            # every file on this page is in the manifest now, so the crawl can resume after it
+            if end_page is None:
+                save_state(dataset_num, page, final_page)
+            elif final_page:
+                shardLeases.datasetEnded(dataset_num, page)
+
+            if final_page and self.sync_run is not None:
+                self.sync_run.datasetListed(dataset_num)
+
+            if(final_page):
+
+                _log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Dataset {dataset_num} reached end condition",
+                     event="dataset_end", dataset=dataset_num, page=page)
+
+                poolDownloader.signalStart()
+                poolDownloader.producerDone()
+                break
+
+            page += 1
+            if self.pageFetchConcurrency == 1:
+                randomDelay(self.timeBetweenPages)
+
+        # pages fetched speculatively past the end of the dataset are not needed
+        for future in in_flight.values():
+            future.cancel()
+
+
+    def crawlDataset(self, dataset_num, page_offset, end_page=None):
+
+        import poolDownloader
+
+        # Set dataset info before enqueuing URLs
+        poolDownloader.setDatasetInfo(dataset_num, page_offset)
+
+        # Enqueue pages starting at the correct offset
+        self.updatePool(dataset_num, page_offset, end_page)
+
+
+    def crawlShard(self):
+
+        ## Shard mode: claim page ranges (shared manifest or coordinator) until none are left. While other
+        ## shards still hold leases, keep checking, since a shard that dies leaves its ranges to us.
+
+        import poolDownloader
+
+        while not self._stop_crawl.is_set():
+            lease = shardLeases.claim(self.datasets)
+
+            if lease is None:
+                if not shardLeases.othersActive():
+                    break
+                self._stop_crawl.wait(min(self.leaseSeconds / 3, 30))
+                continue
+
+            dataset_num, first_page, last_page = lease
 
             poolDownloader.log_event(
                 poolDownloader.failed_log,
-                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Dataset {dataset_num} reached end condition"
+                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Shard {shardLeases.owner} claimed Dataset {dataset_num}, Pages {first_page}-{last_page}",
+                event="lease_claimed", shard=shardLeases.owner, dataset=dataset_num, page=first_page, end_page=last_page
             )
 
-            poolDownloader.log_event(
-                poolDownloader.alt_log,
-                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Dataset {dataset_num} reached end condition"
-            )
+            self.crawlDataset(dataset_num, first_page, last_page)
 
+            if not self._stop_crawl.is_set():  # an interrupted range is released on exit and crawled again
+                shardLeases.crawled(dataset_num, first_page, last_page)
 
-            poolDownloader.signalStart()
-            poolDownloader.producerDone()
-            break
+    #---------------#
+
+    def _queuePending(self):
+
+        # Re-queue every file that was discovered on a previous run but never finished.
+        # Shards skip this: unfinished files belong to ranges that are re-claimed and crawled again.
+
+        pending = [] if self.shardMode else fileManifest.pendingFiles(self.datasets)
+        if pending:
+            self.downloader.queue(pending)
+            _log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Resuming {len(pending)} unfinished files from the manifest")
+
+        # placeholders whose alternate probe was cut short; their pages are not listed again
+        unprobed = [] if self.shardMode else fileManifest.unprobedPlaceholders(self.datasets)
+        if unprobed:
+            self.downloader.probe(unprobed)
+            _log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Resuming {len(unprobed)} unfinished alternate probes from the manifest")
+        return len(pending) + len(unprobed)
+
+    def _interrupted(self):
+        self.stop()
+        _log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Interrupted by user")
+
+    def crawl(self):
+
+        ## List every dataset (resuming after the last crawled page) and download what it finds
+
+        # Load state and resume from where we left off
+        self._startServices()
+        state = {} if self.shardMode else load_state(self.datasets)
 
-        page += 1
-        randomDelay(timeBetweenPages)
+        try:
+            self._queuePending()
+
+            # datasetConcurrency datasets are crawled side by side, in config order
+            crawlers = ThreadPoolExecutor(max_workers=self.datasetConcurrency, thread_name_prefix="crawl")
+            crawls = []
+
+            if self.shardMode:
+                crawls = [crawlers.submit(self.crawlShard) for _ in range(self.datasetConcurrency)]
+
+            for iterand in ([] if self.shardMode else self.datasets):
+                last_page, finished = state.get(iterand, (None, False))
+
+                if self.sync_run is not None:  # a sync always lists every page again
+                    last_page, finished = None, False
+
+                if finished:
+                    continue
 
+                # If we’re resuming mid-dataset, continue after the last crawled page, otherwise start at 0
+                page_offset = last_page + 1 if last_page is not None else 0
 
+                if last_page is not None:
+                    _log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Resuming from Dataset {iterand}, Page {page_offset}")
 
+                crawls.append(crawlers.submit(self.crawlDataset, iterand, page_offset))
 
+            for crawl in crawls:
+                crawl.result()
 
+            crawlers.shutdown()
 
+            self.downloader.finish()
+            self._packFinished()
+            return True
 
-# Load state and resume from where we left off
-state = load_state()
-last_dataset = state.get("last_dataset")
-last_page = state.get("last_page")
+        except KeyboardInterrupt:
+            self._interrupted()
+            return False
 
+    def sync(self):
 
-try:
+        ## Re-list every dataset, download new files and mark removed and retracted ones.
+        ## Returns the sync report, or None if the run was interrupted.
 
+        import catalogSync
+        import poolDownloader
 
-    downloader_thread = threading.Thread(
-        target=poolDownloader.downloadFromPool,
-        args=(directory, downloadWorkers, timeBetweenFiles, s, trustLocalFiles),
-    )
-    downloader_thread.start()
+        self.openManifest()
+        # snapshot of the catalog before the listings are read again
+        self.sync_run = catalogSync.SyncRun(self.datasets)
 
-    start_index = 0
-    if last_dataset is not None:
         try:
-            start_index = datasets.index(int(last_dataset))
+            if not self.crawl():
+                return None
 
-            poolDownloader.log_event(
-                poolDownloader.failed_log,
-                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Resuming from Dataset {last_dataset}, Page {last_page}"
-            )
-            poolDownloader.log_event(
-                poolDownloader.alt_log,
-                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Resuming from Dataset {last_dataset}, Page {last_page}"
-            )
-        except ValueError:
-            start_index = 0
-            poolDownloader.log_event(
-                poolDownloader.failed_log,
-                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Starting scraping from beginning of configured dataset"
-            )
-            poolDownloader.log_event(
-                poolDownloader.alt_log,
-                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Starting scraping from beginning of configured dataset"
+            report = catalogSync.finish(
+                self.sync_run,
+                head=(lambda url: poolDownloader.head_with_retry(self.session, url)) if self.config["syncCheckRetractions"] else None,
+                is_placeholder_size=poolDownloader.placeholderSized,
             )
+        finally:
+            self.sync_run = None
 
-    # Only iterate from the resume point onward
-    for iterand in datasets[start_index:]:
-        # If we’re resuming mid-dataset, use last_page, otherwise start at 0
-        page_offset = last_page if iterand == last_dataset else 0
+        summary = f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Sync finished, {report['counts']} | pages {report['pages']} | {report['path']}"
+        poolDownloader.log_event(poolDownloader.failed_log, summary, event="sync_finished", **report["counts"])
+        return report
 
-        # Set dataset info before enqueuing URLs
-        poolDownloader.setDatasetInfo(iterand, page_offset)
+    def fetch(self):
 
-        # Enqueue pages starting at the correct offset
-        updatePool(iterand, page_offset)
-
-        # Save resume state **after** scraping that dataset’s pages
-        save_state(poolDownloader.getLastLocation())
-            
-except KeyboardInterrupt:
-
-    poolDownloader.signalStart()
-    poolDownloader.empty_pool(downloadWorkers)
-    poolDownloader.producerDone()
-    
-
-    poolDownloader.log_event(
-        poolDownloader.failed_log,
-        f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Interrupted by user"
-    )
-    poolDownloader.log_event(
-        poolDownloader.alt_log,
-        f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Interrupted by user"
-    )
-
-
-finally:        
-    poolDownloader.empty_pool(downloadWorkers)
-
-    lastLocation = poolDownloader.getLastLocation()
-
-    poolDownloader.log_event(
-        poolDownloader.failed_log,
-        f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Log closed, scraper exiting at Dataset {lastLocation[0]}, Page {lastLocation[1]}"
-    )
-    poolDownloader.log_event(
-        poolDownloader.alt_log,
-        f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Log closed, scraper exiting at Dataset {lastLocation[0]}, Page {lastLocation[1]}"
-    )
+        ## Download the files the manifest knows but has not finished, without listing any pages
+
+        self._startServices()
+        try:
+            queued = self._queuePending()
+            self.downloader.finish()
+            self._packFinished()
+            return queued
+        except KeyboardInterrupt:
+            self._interrupted()
+            return None
+
+    def verify(self, check_hash=True):
+
+        ## Audit the download tree against the manifest and re-queue bad files. Returns the report.
+
+        import integrityAudit
+
+        self._configureLogs()
+        self.openManifest()
+        self._migrateLayout()
+
+        return integrityAudit.run(self.config["directory"], self.datasets, workers=self.config["verifyWorkers"], check_hash=check_hash,
+                                  log=self._writeLog)
+
+    def migrate(self):
+
+        ## Move the download tree to the configured storageLayout. Returns the number of files moved.
+
+        return self._migrateLayout()
+
+    def pack(self):
+
+        ## Move finished files of at most packMaxBytes into their shard's archive. Returns the
+        ## number of files packed. crawl and fetch do this by themselves with storageLayout: packed.
+
+        self._configureLogs()
+        self.openManifest()
+        self._migrateLayout()
+
+        packed = storageLayout.pack(self.config["directory"], self.datasets, self.config["packMaxBytes"], log=self._writeLog)
+        if packed:
+            self._writeLog(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Packed {packed} files", event="packed", count=packed)
+        return packed
+
+    def _packFinished(self):
+        if storageLayout.layout() == "packed":
+            self.pack()
+
+    def status(self):
+
+        ## Crawl position and file counts per dataset, read from the manifest only
+
+        self.openManifest()
+        positions = fileManifest.crawlPositions()
+        counts = fileManifest.statusCounts(self.datasets)
+
+        report = {}
+        for dataset in self.datasets:
+            last_page, finished = positions.get(dataset, (None, False))
+            files = counts.get(dataset, {})
+            report[dataset] = {"last_page": last_page, "finished": finished, "files": sum(files.values()), "status": files}
+        return report
+
+
+#---------------#
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog="epsteinScraper.py", description="Download the DOJ Epstein disclosure datasets.")
+    parser.add_argument("command", nargs="?", default="crawl", choices=COMMANDS,
+                        help="crawl: list the datasets and download (default); fetch: only download what the manifest has pending; "
+                             "sync: re-list everything and report changes; verify: audit the files on disk; status: show progress; "
+                             "migrate: move the files to the configured storageLayout; pack: zip small finished files; "
+                             "coordinate: serve shard leases to shards on other hosts")
+    parser.add_argument("--config", default=CONFIG_FILE, help="config file, created with the defaults if missing")
+    parser.add_argument("--quick", action="store_true", help="verify: skip the SHA-256 check")
+    parser.add_argument("--json", action="store_true", help="status: print JSON")
+    args = parser.parse_args(argv)
+
+    # status only reads; every other command completes the config file like a normal run
+    config = loadConfig(args.config, write_back=args.command != "status")
+
+    if args.command == "coordinate":
+        import leaseCoordinator
+        leaseCoordinator.run(config["manifestPath"], config["coordinatorPort"], config["coordinatorHost"], config["coordinatorToken"])
+        return 0
+
+    with Scraper(config) as scraper:
+
+        if args.command == "status":
+            report = scraper.status()
+            if args.json:
+                print(json.dumps(report, indent=1))
+            else:
+                for dataset, entry in report.items():
+                    where = "finished" if entry["finished"] else ("not started" if entry["last_page"] is None else f"page {entry['last_page']}")
+                    states = ", ".join(f"{status} {n}" for status, n in sorted(entry["status"].items()))
+                    print(f"Dataset {dataset}: {where} | {entry['files']} files" + (f" ({states})" if states else ""))
+
+        elif args.command == "verify":
+            import integrityAudit
+            report = scraper.verify(check_hash=not args.quick)
+            print(f"Checked {report['checked']} files in {report['seconds']}s, {report['bad']} re-queued {report['problems']}. "
+                  f"Report written to {integrityAudit.REPORT_FILE}")
+
+        elif args.command == "migrate":
+            print(f"Moved {scraper.migrate()} files to the {storageLayout.layout()} layout")
+
+        elif args.command == "pack":
+            print(f"Packed {scraper.pack()} files")
+
+        elif args.command == "sync":
+            report = scraper.sync()
+            if report is not None:
+                print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Sync finished, {report['counts']} | pages {report['pages']} | {report['path']}")
+
+        elif args.command == "fetch":
+            scraper.fetch()
+
+        else:
+            scraper.crawl()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
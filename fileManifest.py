@@ -0,0 +1,663 @@
+import os
+import sqlite3
+import threading
+import time
+import completionJournal
+
+
+## Persistent manifest of every discovered EFTA file and of how far each dataset has been crawled.
+## Worker updates are buffered and written in batched transactions, and skip decisions are a
+## primary key lookup instead of a HEAD request. Finished files also go to a completion journal
+## first (see completionJournal), so the updates still buffered when a run dies are not lost.
+
+MANIFEST_FILE = "manifest.db"
+
+BATCH_SIZE = 200        # flush buffered status updates after this many rows
+BATCH_SECONDS = 2.0     # ...or after this long, whichever comes first
+
+# file statuses
+PENDING = "pending"          # discovered, not downloaded yet
+DONE = "done"                # downloaded (or verified) and complete on disk
+FAILED = "failed"            # last attempt errored, retried on the next run
+PROBING = "probing"          # "No Images Produced" PDF whose alternate probe has not finished yet
+PLACEHOLDER = "placeholder"  # "No Images Produced" PDF that was probed, alt_url holds the alternate if one was found
+REMOVED = "removed"          # no longer listed on the DOJ site (sync mode), the local copy is kept
+RETRACTED = "retracted"      # downloaded earlier, the server now serves a placeholder or 404; local copy kept
+
+JOURNALED = (DONE, FAILED, PROBING, PLACEHOLDER)  # outcomes written to the completion journal
+
+# lease statuses for sharded runs, one lease per page range of a dataset
+LEASE_OPEN = "open"          # released or never claimed, free for any shard
+LEASE_HELD = "leased"        # a shard is crawling the range
+LEASE_CRAWLED = "crawled"    # every page is listed, the owner is still downloading its files
+LEASE_DONE = "done"          # every file in the range has finished
+
+_conn = None
+_journal = None
+_db_lock = threading.RLock()
+_buffer = {}  # url -> pending column updates, merged so repeated updates to one url cost one write
+_last_flush = time.monotonic()
+
+
+def _now():
+    return time.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def journalPath(path=MANIFEST_FILE, shard=None):
+    # each shard of a shared manifest keeps its own journal
+    return f"{path}.{shard}.journal" if shard else f"{path}.journal"
+
+
+def open_manifest(path=MANIFEST_FILE, shared=False, journal_path=None):
+
+    ## shared: other shard processes on this host open the manifest too (never over NFS/SMB, whose
+    ## locking SQLite cannot rely on); a shared manifest uses a rollback journal.
+    ## journal_path: completion journal to replay and then append to, path.journal by default.
+
+    global _conn, _journal
+
+    with _db_lock:
+        if _conn is not None:
+            return _conn
+
+        _conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=DELETE" if shared else "PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.row_factory = sqlite3.Row
+
+        _conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                url TEXT PRIMARY KEY,
+                dataset INTEGER NOT NULL,
+                page INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                remote_size INTEGER,
+                local_size INTEGER,
+                status TEXT NOT NULL DEFAULT 'pending',
+                alt_url TEXT,
+                discovered_at TEXT,
+                updated_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS files_dataset_page ON files (dataset, page);
+            CREATE INDEX IF NOT EXISTS files_status ON files (status);
+
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                refs INTEGER NOT NULL DEFAULT 1
+            );
+
+            CREATE TABLE IF NOT EXISTS alt_stats (
+                dataset INTEGER NOT NULL,
+                ext TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dataset, ext)
+            );
+
+            CREATE TABLE IF NOT EXISTS crawl (
+                dataset INTEGER PRIMARY KEY,
+                last_page INTEGER,
+                finished INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS leases (
+                dataset INTEGER NOT NULL,
+                start_page INTEGER NOT NULL,
+                end_page INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'open',
+                owner TEXT,
+                expires_at REAL,
+                updated_at TEXT,
+                PRIMARY KEY (dataset, start_page)
+            );
+            CREATE INDEX IF NOT EXISTS leases_owner ON leases (owner, status);
+
+            CREATE TABLE IF NOT EXISTS packed (
+                url TEXT PRIMARY KEY,
+                archive TEXT NOT NULL,
+                member TEXT NOT NULL,
+                size INTEGER NOT NULL
+            );
+        """)
+
+        # columns added after the first manifest version
+        _add_column(_conn, "files", "sha256", "TEXT")
+        _add_column(_conn, "files", "validation", "TEXT")  # result of the post-download checks, see postProcess
+        _conn.execute("CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256)")
+
+        # outcomes that were journaled but not yet committed when the last run stopped
+        _journal = completionJournal.CompletionJournal(journal_path or journalPath(path))
+        replayed = _journal.replay()
+        if replayed:
+            _transaction(lambda db: [_writeUpdate(db, url, update) for url, update in replayed])
+        _journal.compact()
+
+        return _conn
+
+
+def _add_column(db, table, column, column_type):
+    columns = {row["name"] for row in db.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+def _db():
+    return _conn if _conn is not None else open_manifest()
+
+
+def _transaction(work, immediate=False):
+
+    ## immediate takes the write lock up front, so a read-then-write cannot race another process
+
+    with _db_lock:
+        db = _db()
+        db.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            work(db)
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+
+def recordDiscovered(poolObjects):
+
+    ## Insert newly discovered (dataset, page, url) tuples, one transaction per batch.
+    ## Existing rows keep their status so a re-crawl never resets finished files.
+
+    now = _now()
+    rows = [(obj[2], obj[0], obj[1], os.path.basename(obj[2]), now, now) for obj in poolObjects]
+    if not rows:
+        return
+
+    _transaction(lambda db: db.executemany(
+        "INSERT OR IGNORE INTO files (url, dataset, page, filename, discovered_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+        rows
+    ))
+
+
+def markStatus(url, status, remote_size=None, local_size=None, alt_url=None, sha256=None):
+
+    ## Buffer a status change, written with the next batch
+
+    update = {"status": status, "updated_at": _now()}
+    if remote_size is not None:
+        update["remote_size"] = remote_size
+    if local_size is not None:
+        update["local_size"] = local_size
+    if alt_url is not None:
+        update["alt_url"] = alt_url
+    if sha256 is not None:
+        update["sha256"] = sha256
+
+    with _db_lock:
+        if status in JOURNALED and _journal is not None:
+            _journal.append(url, update)
+        _buffer.setdefault(url, {}).update(update)
+
+        if len(_buffer) >= BATCH_SIZE or time.monotonic() - _last_flush > BATCH_SECONDS:
+            flush()
+
+
+def recordCheck(url, result, sha256=None):
+
+    ## Buffer the post-download check result of a finished file, "ok" or the problem found
+
+    update = {"validation": result, "updated_at": _now()}
+    if sha256 is not None:
+        update["sha256"] = sha256
+
+    with _db_lock:
+        _buffer.setdefault(url, {}).update(update)
+
+        if len(_buffer) >= BATCH_SIZE or time.monotonic() - _last_flush > BATCH_SECONDS:
+            flush()
+
+
+def flush():
+    global _last_flush
+
+    with _db_lock:
+        _last_flush = time.monotonic()
+        if not _buffer:
+            return
+
+        def write(db):
+            for url, update in _buffer.items():
+                _writeUpdate(db, url, update)
+
+        _transaction(write)
+        _buffer.clear()
+
+        # everything journaled so far is committed now
+        if _journal is not None:
+            _journal.compact()
+
+
+def _writeUpdate(db, url, update):
+    columns = ", ".join(f"{column} = ?" for column in update)
+    db.execute(f"UPDATE files SET {columns} WHERE url = ?", (*update.values(), url))
+
+
+def lookup(url):
+
+    ## Return the manifest row for url as a dict (including unflushed updates), or None
+
+    with _db_lock:
+        row = _db().execute("SELECT * FROM files WHERE url = ?", (url,)).fetchone()
+        entry = dict(row) if row is not None else None
+
+        if url in _buffer:
+            if entry is None:
+                return None
+            entry.update(_buffer[url])
+
+    return entry
+
+
+def isComplete(url, path):
+
+    ## Indexed lookup replacing the HEAD round-trip: the file is done if the manifest
+    ## says so and the file on disk still has the size we recorded when it finished
+
+    entry = lookup(url)
+    if entry is None:
+        return False
+
+    if entry["status"] == PLACEHOLDER:
+        return entry["alt_url"] is not None  # the alternate has its own row
+
+    if entry["status"] not in (DONE, RETRACTED) or entry["local_size"] is None:
+        return False
+
+    try:
+        return os.path.getsize(path) == entry["local_size"]
+    except OSError:
+        # no loose file, it may have been packed into an archive (see storageLayout)
+        packed = packedEntry(url)
+        return packed is not None and packed["size"] == entry["local_size"]
+
+
+def pendingFiles(datasets):
+
+    ## Files that were discovered but never finished, in (dataset, page) order
+
+    flush()
+    marks = ", ".join("?" for _ in datasets)
+    with _db_lock:
+        rows = _db().execute(
+            f"SELECT dataset, page, url FROM files WHERE status IN (?, ?) AND dataset IN ({marks}) ORDER BY dataset, page, url",
+            (PENDING, FAILED, *datasets)
+        ).fetchall()
+    return [(row["dataset"], row["page"], row["url"]) for row in rows]
+
+
+def unprobedPlaceholders(datasets):
+
+    ## Placeholders whose alternate probe was dropped or never finished, for the probe stage
+
+    flush()
+    marks = ", ".join("?" for _ in datasets)
+    with _db_lock:
+        rows = _db().execute(
+            f"SELECT dataset, page, url FROM files WHERE status = ? AND dataset IN ({marks}) ORDER BY dataset, page, url",
+            (PROBING, *datasets)
+        ).fetchall()
+    return [(row["dataset"], row["page"], row["url"]) for row in rows]
+
+
+def completedFiles(datasets):
+
+    ## Manifest rows of every file recorded as done, as dicts, for the integrity audit
+
+    flush()
+    marks = ", ".join("?" for _ in datasets)
+    with _db_lock:
+        rows = _db().execute(
+            f"SELECT f.url, f.dataset, f.page, f.local_size, f.remote_size, f.sha256, p.archive, p.member FROM files f "
+            f"LEFT JOIN packed p ON p.url = f.url WHERE f.status = ? AND f.dataset IN ({marks}) ORDER BY f.dataset, f.page, f.url",
+            (DONE, *datasets)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def requeue(urls):
+
+    ## Back to pending with the recorded size and hash cleared, picked up by pendingFiles
+
+    flush()
+    now = _now()
+
+    def work(db):
+        db.executemany(
+            "UPDATE files SET status = ?, local_size = NULL, sha256 = NULL, updated_at = ? WHERE url = ?",
+            [(PENDING, now, url) for url in urls]
+        )
+        # a bad packed copy is downloaded again as a loose file
+        db.executemany("DELETE FROM packed WHERE url = ?", [(url,) for url in urls])
+
+    _transaction(work)
+
+
+def catalog(dataset):
+
+    ## {url: (page, status)} of every listed file of a dataset, leaving out the alternates
+    ## (which are never on a listing page themselves)
+
+    flush()
+    with _db_lock:
+        rows = _db().execute(
+            "SELECT url, page, status FROM files WHERE dataset = ? "
+            "AND url NOT IN (SELECT alt_url FROM files WHERE alt_url IS NOT NULL)",
+            (dataset,)
+        ).fetchall()
+    return {row["url"]: (row["page"], row["status"]) for row in rows}
+
+
+def applySync(removed=(), restored=(), moved=(), retracted=()):
+
+    ## Catalog changes found by sync mode. moved is [(url, page)]; restored files return to
+    ## done if they were downloaded before, pending otherwise.
+
+    flush()
+    now = _now()
+
+    def work(db):
+        db.executemany("UPDATE files SET status = ?, updated_at = ? WHERE url = ?", [(REMOVED, now, url) for url in removed])
+        db.executemany("UPDATE files SET status = ?, updated_at = ? WHERE url = ?", [(RETRACTED, now, url) for url in retracted])
+        db.executemany(
+            "UPDATE files SET status = CASE WHEN local_size IS NOT NULL THEN ? ELSE ? END, updated_at = ? WHERE url = ? AND status = ?",
+            [(DONE, PENDING, now, url, REMOVED) for url in restored]
+        )
+        db.executemany("UPDATE files SET page = ?, updated_at = ? WHERE url = ?", [(page, now, url) for url, page in moved])
+
+    _transaction(work)
+
+
+def blobPath(sha256):
+    with _db_lock:
+        row = _db().execute("SELECT path FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    return row["path"] if row is not None else None
+
+
+def recordBlob(sha256, path, size):
+    with _db_lock:
+        _db().execute(
+            "INSERT INTO blobs (sha256, path, size) VALUES (?, ?, ?) "
+            "ON CONFLICT(sha256) DO UPDATE SET path = excluded.path, size = excluded.size",
+            (sha256, path, size)
+        )
+
+
+def addBlobReference(sha256):
+    with _db_lock:
+        _db().execute("UPDATE blobs SET refs = refs + 1 WHERE sha256 = ?", (sha256,))
+
+
+def renameBlobPaths(moves):
+
+    ## Follow files moved by a storage layout migration, [(old_path, new_path)]
+
+    _transaction(lambda db: db.executemany("UPDATE blobs SET path = ? WHERE path = ?", [(new, old) for old, new in moves]))
+
+
+def packCandidates(datasets, max_size):
+
+    ## Finished files of at most max_size bytes that are not in an archive yet
+
+    flush()
+    marks = ", ".join("?" for _ in datasets)
+    with _db_lock:
+        rows = _db().execute(
+            f"SELECT f.url, f.dataset, f.local_size FROM files f LEFT JOIN packed p ON p.url = f.url "
+            f"WHERE f.status = ? AND f.local_size IS NOT NULL AND f.local_size <= ? AND p.url IS NULL AND f.dataset IN ({marks}) "
+            f"ORDER BY f.dataset, f.url",
+            (DONE, max_size, *datasets)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def recordPacked(rows):
+
+    ## Index files written into an archive, [(url, archive, member, size)]
+
+    _transaction(lambda db: db.executemany(
+        "INSERT INTO packed (url, archive, member, size) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(url) DO UPDATE SET archive = excluded.archive, member = excluded.member, size = excluded.size",
+        rows
+    ))
+
+
+def packedEntry(url):
+    with _db_lock:
+        row = _db().execute("SELECT archive, member, size FROM packed WHERE url = ?", (url,)).fetchone()
+    return dict(row) if row is not None else None
+
+
+def recordAlternateHit(dataset, ext):
+    with _db_lock:
+        _db().execute(
+            "INSERT INTO alt_stats (dataset, ext, hits) VALUES (?, ?, 1) "
+            "ON CONFLICT(dataset, ext) DO UPDATE SET hits = hits + 1",
+            (dataset, ext)
+        )
+
+
+def alternateStats():
+
+    ## {dataset: {ext: hits}} for every alternate extension found so far
+
+    with _db_lock:
+        rows = _db().execute("SELECT dataset, ext, hits FROM alt_stats").fetchall()
+
+    stats = {}
+    for row in rows:
+        stats.setdefault(row["dataset"], {})[row["ext"]] = row["hits"]
+    return stats
+
+
+def saveCrawlPosition(dataset, page, finished=False):
+    with _db_lock:
+        _db().execute(
+            "INSERT INTO crawl (dataset, last_page, finished, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(dataset) DO UPDATE SET last_page = excluded.last_page, finished = excluded.finished, updated_at = excluded.updated_at",
+            (dataset, page, int(finished), _now())
+        )
+
+
+def statusCounts(datasets=None):
+
+    ## {dataset: {status: files}} over the whole manifest, or only the given datasets
+
+    flush()
+    query = "SELECT dataset, status, COUNT(*) AS n FROM files"
+    params = ()
+    if datasets is not None:
+        query += f" WHERE dataset IN ({', '.join('?' for _ in datasets)})"
+        params = tuple(datasets)
+    with _db_lock:
+        rows = _db().execute(query + " GROUP BY dataset, status ORDER BY dataset", params).fetchall()
+
+    counts = {}
+    for row in rows:
+        counts.setdefault(row["dataset"], {})[row["status"]] = row["n"]
+    return counts
+
+
+def crawlPositions():
+
+    ## {dataset: (last_page, finished)} for every dataset that has been crawled
+
+    with _db_lock:
+        rows = _db().execute("SELECT dataset, last_page, finished FROM crawl").fetchall()
+    return {row["dataset"]: (row["last_page"], bool(row["finished"])) for row in rows}
+
+
+def recordDatasetEnd(dataset, page):
+
+    ## A shard found the last page of a dataset. The earliest end reported wins (a range past
+    ## the end can look like a last page too), and ranges that start after it are closed.
+
+    def work(db):
+        db.execute(
+            "INSERT INTO crawl (dataset, last_page, finished, updated_at) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT(dataset) DO UPDATE SET "
+            "last_page = CASE WHEN crawl.finished AND crawl.last_page IS NOT NULL THEN MIN(crawl.last_page, excluded.last_page) ELSE excluded.last_page END, "
+            "finished = 1, updated_at = excluded.updated_at",
+            (dataset, page, _now())
+        )
+        db.execute(
+            "UPDATE leases SET status = ?, updated_at = ? WHERE dataset = ? AND start_page > ?",
+            (LEASE_DONE, _now(), dataset, page)
+        )
+
+    _transaction(work, immediate=True)
+
+
+def claimLease(owner, datasets, pages, seconds):
+
+    ## Claim the first free page range of the first dataset that has one: an open or expired
+    ## lease, or else a new range after the last one while the end of the dataset is unknown.
+    ## Returns (dataset, start_page, end_page) or None when there is nothing left to claim.
+
+    claimed = []
+
+    def work(db):
+        now = time.time()
+        for dataset in datasets:
+            end = db.execute("SELECT last_page FROM crawl WHERE dataset = ? AND finished = 1", (dataset,)).fetchone()
+            end = end["last_page"] if end is not None else None
+
+            row = db.execute(
+                "SELECT start_page, end_page FROM leases WHERE dataset = ? "
+                "AND (status = ? OR (status IN (?, ?) AND expires_at < ?)) "
+                "AND (? IS NULL OR start_page <= ?) ORDER BY start_page LIMIT 1",
+                (dataset, LEASE_OPEN, LEASE_HELD, LEASE_CRAWLED, now, end, end)
+            ).fetchone()
+
+            if row is not None:
+                start, last = row["start_page"], row["end_page"]
+                db.execute(
+                    "UPDATE leases SET status = ?, owner = ?, expires_at = ?, updated_at = ? WHERE dataset = ? AND start_page = ?",
+                    (LEASE_HELD, owner, now + seconds, _now(), dataset, start)
+                )
+            elif end is None:
+                previous = db.execute("SELECT MAX(end_page) AS last FROM leases WHERE dataset = ?", (dataset,)).fetchone()["last"]
+                start = 0 if previous is None else previous + 1
+                last = start + pages - 1
+                db.execute(
+                    "INSERT INTO leases (dataset, start_page, end_page, status, owner, expires_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (dataset, start, last, LEASE_HELD, owner, now + seconds, _now())
+                )
+            else:
+                continue
+
+            claimed.append((dataset, start, last))
+            return
+
+    _transaction(work, immediate=True)
+    return claimed[0] if claimed else None
+
+
+def markLeaseCrawled(owner, dataset, start_page):
+    with _db_lock:
+        _db().execute(
+            "UPDATE leases SET status = ?, updated_at = ? WHERE owner = ? AND dataset = ? AND start_page = ? AND status = ?",
+            (LEASE_CRAWLED, _now(), owner, dataset, start_page, LEASE_HELD)
+        )
+
+
+def renewLeases(owner, seconds):
+    with _db_lock:
+        _db().execute(
+            "UPDATE leases SET expires_at = ? WHERE owner = ? AND status IN (?, ?)",
+            (time.time() + seconds, owner, LEASE_HELD, LEASE_CRAWLED)
+        )
+
+
+def completeLeases(owner):
+
+    ## Close every crawled range of owner whose files have all finished. Failed files count
+    ## as finished here, they stay "failed" and are retried by the next unsharded run.
+
+    flush()
+
+    def work(db):
+        rows = db.execute(
+            "SELECT dataset, start_page, end_page FROM leases WHERE owner = ? AND status = ?",
+            (owner, LEASE_CRAWLED)
+        ).fetchall()
+        for row in rows:
+            if _unfinishedFiles(db, row["dataset"], row["start_page"], row["end_page"]) == 0:
+                db.execute(
+                    "UPDATE leases SET status = ?, updated_at = ? WHERE dataset = ? AND start_page = ?",
+                    (LEASE_DONE, _now(), row["dataset"], row["start_page"])
+                )
+
+    _transaction(work, immediate=True)
+
+
+def _unfinishedFiles(db, dataset, start_page, end_page):
+    return db.execute(
+        "SELECT COUNT(*) AS n FROM files WHERE dataset = ? AND page BETWEEN ? AND ? AND status IN (?, ?)",
+        (dataset, start_page, end_page, PENDING, PROBING)
+    ).fetchone()["n"]
+
+
+def rangeFinished(dataset, start_page, end_page):
+
+    ## True once every file of the page range has finished, in this manifest
+
+    flush()
+    with _db_lock:
+        return _unfinishedFiles(_db(), dataset, start_page, end_page) == 0
+
+
+def closeLeases(owner, ranges):
+
+    ## Close crawled ranges [(dataset, start_page)] of owner that the shard reports finished
+    ## (see leaseCoordinator: the files live in the shard's own manifest)
+
+    _transaction(lambda db: db.executemany(
+        "UPDATE leases SET status = ?, updated_at = ? WHERE owner = ? AND dataset = ? AND start_page = ? AND status = ?",
+        [(LEASE_DONE, _now(), owner, dataset, start_page, LEASE_CRAWLED) for dataset, start_page in ranges]
+    ), immediate=True)
+
+
+def releaseLeases(owner):
+
+    ## Hand back every unfinished range of owner so other shards can claim it right away
+
+    with _db_lock:
+        _db().execute(
+            "UPDATE leases SET status = ?, owner = NULL, expires_at = NULL, updated_at = ? WHERE owner = ? AND status IN (?, ?)",
+            (LEASE_OPEN, _now(), owner, LEASE_HELD, LEASE_CRAWLED)
+        )
+
+
+def activeLeases(exclude_owner=None):
+
+    ## Number of unexpired leases held by other shards
+
+    with _db_lock:
+        row = _db().execute(
+            "SELECT COUNT(*) AS n FROM leases WHERE status IN (?, ?) AND expires_at >= ? AND owner IS NOT ?",
+            (LEASE_HELD, LEASE_CRAWLED, time.time(), exclude_owner)
+        ).fetchone()
+    return row["n"]
+
+
+def close():
+    global _conn, _journal
+
+    with _db_lock:
+        if _conn is None:
+            return
+        flush()
+        if _journal is not None:
+            _journal.close()
+            _journal = None
+        _conn.close()
+        _conn = None
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import contentStore
+import fileManifest
+import storageLayout
+
+
+## Offline audit of the download tree against the manifest, with no requests to the server.
+## Every file the manifest records as done is checked for its recorded size, for the PDF header
+## and %%EOF trailer, and (unless quick) for its SHA-256, spread over a process pool. Bad files are
+## set back to pending so the next run downloads them again; a truncated file is kept as .part
+## so that download continues from the bytes already on disk.
+
+REPORT_FILE = os.path.join("logs", "verify_report.json")
+TAIL_BYTES = 1024  # %%EOF has to appear near the end, after it only whitespace or a short trailer
+
+
+def checkPdf(path):
+
+    ## Structural check: %PDF- header and an %%EOF marker in the last bytes
+
+    with open(path, "rb") as f:
+        if not f.read(5).startswith(b"%PDF-"):
+            return "bad_pdf_header"
+        size = os.fstat(f.fileno()).st_size
+        f.seek(max(0, size - TAIL_BYTES))
+        if b"%%EOF" not in f.read():
+            return "bad_pdf_trailer"
+    return None
+
+
+def auditFile(entry, check_hash=True):
+
+    ## Problem found with one file, or None. Runs in a worker process, so only plain data in and out.
+
+    if entry.get("archive") and not os.path.exists(entry["path"]):
+        return auditMember(entry, check_hash)
+
+    path = entry["path"]
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return "missing"
+
+    expected = entry["local_size"] if entry["local_size"] is not None else entry["remote_size"]
+    if expected is not None and size != expected:
+        return "truncated" if size < expected else "size_mismatch"
+
+    if path.lower().endswith(".pdf"):
+        problem = checkPdf(path)
+        if problem:
+            # a short PDF without its trailer is a cut-off transfer
+            return "truncated" if problem == "bad_pdf_trailer" and expected is None else problem
+
+    if check_hash and entry["sha256"] and contentStore.hashFile(path) != entry["sha256"]:
+        return "hash_mismatch"
+
+    return None
+
+
+def auditMember(entry, check_hash=True):
+
+    ## The same checks for a file packed into an archive (see storageLayout). zipfile checks
+    ## the member's CRC while it is read, so a damaged member shows up as bad_archive_member.
+
+    try:
+        with zipfile.ZipFile(entry["archive"]) as archive:
+            info = archive.getinfo(entry["member"])
+
+            expected = entry["local_size"] if entry["local_size"] is not None else entry["remote_size"]
+            if expected is not None and info.file_size != expected:
+                return "truncated" if info.file_size < expected else "size_mismatch"
+
+            is_pdf = entry["member"].lower().endswith(".pdf")
+            hasher = hashlib.sha256() if check_hash and entry["sha256"] else None
+            head, tail = b"", b""
+            with archive.open(info) as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    if hasher is not None:
+                        hasher.update(block)
+                    if len(head) < 5:
+                        head += block[:5]
+                    tail = (tail + block)[-TAIL_BYTES:]
+    except (OSError, KeyError):
+        return "missing"
+    except zipfile.BadZipFile:
+        return "bad_archive_member"
+
+    if is_pdf:
+        if not head.startswith(b"%PDF-"):
+            return "bad_pdf_header"
+        if b"%%EOF" not in tail:
+            return "bad_pdf_trailer"
+
+    if hasher is not None and hasher.hexdigest() != entry["sha256"]:
+        return "hash_mismatch"
+
+    return None
+
+
+def _auditBatch(entries, check_hash):
+    return [(entry["url"], auditFile(entry, check_hash)) for entry in entries]
+
+
+def _executor(workers):
+    # importing epsteinScraper has no side effects, so spawned workers are as safe as forked ones;
+    # threads remain the fallback where no process pool can start (they still overlap the I/O)
+    try:
+        return ProcessPoolExecutor(max_workers=workers)
+    except (OSError, NotImplementedError):
+        return ThreadPoolExecutor(max_workers=workers)
+
+
+def audit(out_dir, datasets, workers=None, check_hash=True, batch=64):
+
+    ## Audit every finished file of datasets. Returns {url: problem} for the bad ones.
+
+    entries = []
+    for row in fileManifest.completedFiles(datasets):
+        row["path"] = storageLayout.filePath(out_dir, row["dataset"], os.path.basename(row["url"]))
+        entries.append(row)
+
+    problems = {}
+    batches = [entries[i:i + batch] for i in range(0, len(entries), batch)]
+
+    with _executor(workers or os.cpu_count() or 1) as pool:
+        for results in pool.map(_auditBatch, batches, [check_hash] * len(batches)):
+            for url, problem in results:
+                if problem:
+                    problems[url] = problem
+
+    return entries, problems
+
+
+def requeue(entries, problems):
+
+    ## Set the bad files back to pending and clear them off disk, keeping truncated ones as .part
+
+    by_url = {entry["url"]: entry for entry in entries}
+    for url, problem in problems.items():
+        path = by_url[url]["path"]
+        try:
+            if problem == "truncated":
+                os.replace(path, path + ".part")
+            elif problem != "missing":
+                os.remove(path)
+        except OSError:
+            pass
+
+    fileManifest.requeue(list(problems))
+
+
+def run(out_dir, datasets, workers=None, check_hash=True, report_path=REPORT_FILE, log=None):
+
+    ## verify mode: audit, re-queue, write the report. Returns the report dict.
+
+    started = time.monotonic()
+    entries, problems = audit(out_dir, datasets, workers, check_hash)
+    requeue(entries, problems)
+
+    counts = {}
+    for problem in problems.values():
+        counts[problem] = counts.get(problem, 0) + 1
+
+    report = {
+        "time": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "datasets": list(datasets),
+        "checked": len(entries),
+        "bad": len(problems),
+        "problems": counts,
+        "hashes_checked": check_hash,
+        "seconds": round(time.monotonic() - started, 2),
+        "files": problems,
+    }
+
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+
+    if log is not None:
+        for url, problem in problems.items():
+            log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Verify: {problem} | {url}", event="verify_failed", url=url, status=problem)
+
+    return report
@@ -0,0 +1,117 @@
+import hmac
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fileManifest
+
+
+## Lease service for shards on several hosts. SQLite locking cannot be trusted on NFS/SMB, so
+## shards on other machines do not open a shared manifest: one process (`epsteinScraper.py
+## coordinate`) keeps the leases table in a manifest on its own local disk and serves it over
+## HTTP, and every shard keeps its own local manifest and download directory and claims,
+## renews and closes page ranges through the coordinator (shardCoordinator in the config).
+## A shard checks locally that the files of a crawled range have finished before it reports
+## the range done. Requests are JSON POSTs, authenticated with coordinatorToken when one is set.
+
+PORT = 8765
+TOKEN_HEADER = "X-Shard-Token"
+
+# operation -> manifest function, each called with the JSON body as keyword arguments
+OPERATIONS = {
+    "claim": fileManifest.claimLease,
+    "crawled": fileManifest.markLeaseCrawled,
+    "renew": fileManifest.renewLeases,
+    "close": fileManifest.closeLeases,
+    "release": fileManifest.releaseLeases,
+    "active": fileManifest.activeLeases,
+    "datasetEnd": fileManifest.recordDatasetEnd,
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        token = self.server.token
+        if token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ""), token):
+            self.send_error(403)
+            return
+
+        operation = OPERATIONS.get(self.path.strip("/"))
+        if operation is None:
+            self.send_error(404)
+            return
+
+        try:
+            args = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            body = json.dumps({"result": operation(**args)}).encode()
+        except (ValueError, TypeError) as e:
+            self.send_error(400, str(e))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port=PORT, host="127.0.0.1", token=""):
+
+    ## Serve the leases of the open manifest on a background thread. Returns the server.
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.token = token
+    threading.Thread(target=server.serve_forever, name="lease-coordinator", daemon=True).start()
+    return server
+
+
+def run(manifest_path, port=PORT, host="127.0.0.1", token=""):
+
+    ## The `coordinate` command: serve until Ctrl+C
+
+    fileManifest.open_manifest(manifest_path)
+    server = serve(port, host, token)
+    print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Serving shard leases from {manifest_path} at http://{host}:{port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        fileManifest.close()
+
+
+class Client:
+
+    ## What a shard uses instead of the lease functions of a shared manifest
+
+    def __init__(self, url, token="", timeout=10, retries=3):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.retries = max(1, retries)
+
+    def call(self, operation, **args):
+        request = urllib.request.Request(
+            f"{self.url}/{operation}", data=json.dumps(args).encode(), method="POST",
+            headers={"Content-Type": "application/json", TOKEN_HEADER: self.token},
+        )
+        for attempt in range(self.retries):
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as r:
+                    return json.load(r)["result"]
+            except urllib.error.HTTPError:
+                raise  # rejected (bad token, bad request), asking again will not help
+            except OSError:
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(2 ** attempt)
@@ -0,0 +1,143 @@
+from html.parser import HTMLParser
+
+try:
+    import lxml.etree
+except ImportError:  # optional, the pure-Python tokenizer below is used instead
+    lxml = None
+
+
+## Single pass extraction of a dataset listing page: the EFTA file names plus the page flags
+## (pagination, "Next page" link, access denied, files still generating) that updatePool needs.
+## Uses lxml's event parser when installed, otherwise a streaming html.parser tokenizer.
+
+GENERATING_FILES_CSS = "list%20still%20generating_files/slick.css"
+
+
+def _is_file_link(href):
+    return "/epstein/files/" in href and "EFTA" in href
+
+
+class _ListingScanner:
+
+    ## Tag callbacks shared by both backends, so they always agree on the result
+
+    def __init__(self):
+        self.files = set()
+        self.pagination = False
+        self.has_next = False
+        self.access_denied = False
+        self.generating_files = False
+        self._pagination_depth = 0  # > 0 while inside the usa-pagination element
+        self._in_title = False
+
+    def start(self, tag, attrs):
+        if self._pagination_depth:
+            self._pagination_depth += 1
+
+        if "usa-pagination" in (attrs.get("class") or "").split():
+            self.pagination = True
+            self._pagination_depth = max(self._pagination_depth, 1)
+
+        if tag == "a":
+            href = attrs.get("href")
+            if href and _is_file_link(href):
+                self.files.add(href.split("/")[-1])
+            if self._pagination_depth and attrs.get("aria-label") == "Next page":
+                self.has_next = True
+
+        elif tag == "link":
+            if attrs.get("href") == GENERATING_FILES_CSS:
+                self.generating_files = True
+
+        elif tag == "title":
+            self._in_title = True
+
+    def end(self, tag):
+        if self._pagination_depth:
+            self._pagination_depth -= 1
+        if tag == "title":
+            self._in_title = False
+
+    def data(self, text):
+        if self._in_title and "Access Denied" in text:
+            self.access_denied = True
+
+    def result(self):
+        return {
+            "files": sorted(self.files),
+            "pagination": self.pagination,
+            "has_next": self.has_next,
+            "access_denied": self.access_denied,
+            "generating_files": self.generating_files,
+        }
+
+
+class _TokenizerParser(HTMLParser):
+
+    # tags html.parser never sends an end tag for, they must not count towards the pagination depth
+    VOID = frozenset({"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"})
+
+    def __init__(self, scanner):
+        super().__init__(convert_charrefs=True)
+        self.scanner = scanner
+
+    def handle_starttag(self, tag, attrs):
+        self.scanner.start(tag, dict(attrs))
+        if tag in self.VOID:
+            self.scanner.end(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.scanner.start(tag, dict(attrs))
+        self.scanner.end(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self.VOID:
+            self.scanner.end(tag)
+
+    def handle_data(self, data):
+        self.scanner.data(data)
+
+
+class _LxmlTarget:
+
+    def __init__(self, scanner):
+        self.scanner = scanner
+
+    def start(self, tag, attrs):
+        self.scanner.start(tag, attrs)
+
+    def end(self, tag):
+        self.scanner.end(tag)
+
+    def data(self, text):
+        self.scanner.data(text)
+
+    def close(self):
+        return self.scanner.result()
+
+
+def extract_tokenizer(html):
+    scanner = _ListingScanner()
+    parser = _TokenizerParser(scanner)
+    parser.feed(html)
+    parser.close()
+    return scanner.result()
+
+
+def extract_lxml(html):
+    scanner = _ListingScanner()
+    parser = lxml.etree.HTMLParser(target=_LxmlTarget(scanner))
+    return lxml.etree.fromstring(html, parser)
+
+
+def extract(html):
+    if lxml is not None:
+        try:
+            return extract_lxml(html)
+        except (lxml.etree.LxmlError, ValueError):
+            pass  # fall back on anything lxml cannot handle
+    return extract_tokenizer(html)
+
+
+def backend():
+    return "lxml" if lxml is not None else "html.parser"
@@ -0,0 +1,127 @@
+import json
+import os
+import queue
+import threading
+import time
+
+
+## Background writer for the scraper logs. write() only puts the record on a queue, so a download
+## thread never waits on file I/O. One thread drains the queue in batches, opens each log once per
+## batch, writes the usual text line to name.log and a JSON record with the structured fields
+## (dataset, page, url, status, exception, timings) to name.jsonl, and rotates a file past
+## max_bytes to name.log.1, name.log.2, ... keeping `backups` old files.
+
+MAX_BYTES = 10 * 1024 * 1024
+BACKUPS = 5
+BATCH_SIZE = 500
+
+_queue = queue.SimpleQueue()
+_writer = None
+_start_lock = threading.Lock()
+_max_bytes = MAX_BYTES
+_backups = BACKUPS
+_structured = True
+
+_STOP = object()
+
+
+def configure(max_bytes=MAX_BYTES, backups=BACKUPS, structured=True):
+    global _max_bytes, _backups, _structured
+    _max_bytes = int(max_bytes)
+    _backups = int(backups)
+    _structured = structured
+
+
+def jsonlPath(log_path):
+    return os.path.splitext(log_path)[0] + ".jsonl"
+
+
+def write(log_path, message, **fields):
+
+    ## Queue one log line. fields become the structured record next to the message.
+
+    record = {"time": time.strftime('%Y-%m-%d %H:%M:%S'), "message": message}
+    record.update((key, value) for key, value in fields.items() if value is not None)
+    _queue.put((log_path, message, record))
+    _ensureStarted()
+
+
+def _ensureStarted():
+    global _writer
+    if _writer is not None:
+        return
+    with _start_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_run, name="log-writer", daemon=True)
+            _writer.start()
+
+
+def _run():
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        stop = False
+        lines = {}   # path -> text lines, in arrival order
+        waiters = []
+        for item in batch:
+            if item is _STOP:
+                stop = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            else:
+                log_path, message, record = item
+                lines.setdefault(log_path, []).append(message + "\n")
+                if _structured:
+                    lines.setdefault(jsonlPath(log_path), []).append(json.dumps(record, default=str) + "\n")
+
+        for path, text in lines.items():
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.writelines(text)
+                    size = f.tell()
+                if _max_bytes and size >= _max_bytes:
+                    _rotate(path)
+            except OSError:
+                pass  # a log that cannot be written must never take the scraper down
+
+        for event in waiters:
+            event.set()
+
+        if stop:
+            return
+
+
+def _rotate(path):
+    if _backups <= 0:
+        os.remove(path)
+        return
+    for index in range(_backups - 1, 0, -1):
+        older = f"{path}.{index}"
+        if os.path.exists(older):
+            os.replace(older, f"{path}.{index + 1}")
+    os.replace(path, f"{path}.1")
+
+
+def flush(timeout=10):
+
+    ## Block until everything queued so far is on disk
+
+    if _writer is None:
+        return
+    done = threading.Event()
+    _queue.put(done)
+    done.wait(timeout)
+
+
+def close():
+    global _writer
+    if _writer is None:
+        return
+    _queue.put(_STOP)
+    _writer.join()
+    _writer = None
@@ -0,0 +1,269 @@
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+## Counters and latency histograms for every stage of a run: page fetch and parse, queue wait,
+## HEAD checks, download time to first byte and throughput, alternate probes per placeholder.
+## Served in the Prometheus text format on metricsPort (GET /metrics) and written as a JSON
+## snapshot to logs/metrics.json every metricsSnapshotSeconds.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+THROUGHPUT_BUCKETS = (16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6)  # bytes per second
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32)
+
+SNAPSHOT_FILE = os.path.join("logs", "metrics.json")
+
+
+class Counter:
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}  # label tuple -> value
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, labels=None):
+        key = _labelKey(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labelText(key)} {value}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return {_labelText(key) or "total": value for key, value in self.values.items()}
+
+    def total(self):
+        with self._lock:
+            return sum(self.values.values())
+
+
+class Histogram:
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.values = {}  # label tuple -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=None):
+        key = _labelKey(labels)
+        with self._lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def time(self, labels=None):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labelText(key + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_labelText(key)} {series[-1]}")
+                lines.append(f"{self.name}_count{_labelText(key)} {cumulative}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for key, series in self.values.items():
+                count = sum(series[:-1])
+                result[_labelText(key) or "total"] = {
+                    "count": count,
+                    "sum": series[-1],
+                    "mean": series[-1] / count if count else 0.0,
+                    "p50": _quantile(self.buckets, series, 0.5),
+                    "p95": _quantile(self.buckets, series, 0.95),
+                }
+            return result
+
+
+class _Timer:
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.monotonic() - self.start, self.labels)
+        return False
+
+
+def _labelKey(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _labelText(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in key) + "}"
+
+
+def _quantile(buckets, series, q):
+    # upper bound of the bucket holding the q-th observation, good enough to see where time goes
+    total = sum(series[:-1])
+    if not total:
+        return 0.0
+    rank = q * total
+    cumulative = 0
+    for bound, count in zip(buckets, series[:-2]):
+        cumulative += count
+        if cumulative >= rank:
+            return bound
+    return float("inf")
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def counter(name, help=""):
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Counter(name, help)
+        return _registry[name]
+
+
+def histogram(name, help="", buckets=LATENCY_BUCKETS):
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Histogram(name, help, buckets)
+        return _registry[name]
+
+
+# the stages instrumented across the scraper
+page_fetch_seconds = histogram("scraper_page_fetch_seconds", "Listing page fetch time, including retries")
+page_parse_seconds = histogram("scraper_page_parse_seconds", "Listing page parse time")
+queue_wait_seconds = histogram("scraper_queue_wait_seconds", "Time a file waits in the download pool")
+head_seconds = histogram("scraper_head_seconds", "HEAD check time, including retries")
+download_ttfb_seconds = histogram("scraper_download_ttfb_seconds", "Time from sending a download request to its response headers")
+download_seconds = histogram("scraper_download_seconds", "Whole transfer time of a download")
+download_throughput = histogram("scraper_download_throughput_bytes_per_second", "Transfer rate of finished downloads", THROUGHPUT_BUCKETS)
+alternate_probes = histogram("scraper_alternate_probes_per_file", "HEAD probes needed to resolve one placeholder", COUNT_BUCKETS)
+connect_seconds = histogram("scraper_connect_seconds", "TCP and TLS handshake time of each new connection, by protocol")
+response_ttfb_seconds = histogram("scraper_response_ttfb_seconds", "Time from sending any request to its response headers, by method and protocol")
+
+pages = counter("scraper_pages_total", "Listing pages consumed, by result")
+files = counter("scraper_files_total", "Files handled by the download workers, by result")
+download_bytes = counter("scraper_download_bytes_total", "Bytes written by downloads")
+responses = counter("scraper_responses_total", "Responses from the server, by status")
+events = counter("scraper_events_total", "Header counters: errors, forbiddens, alternates, unknown alternates")
+http_requests = counter("scraper_http_requests_total", "Requests sent, by protocol")
+connections = counter("scraper_connections_total", "Connections opened, each one a handshake, by protocol")
+checks = counter("scraper_checks_total", "Post-download checks of finished files, by result")
+
+
+def render():
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {"time": time.strftime('%Y-%m-%d %H:%M:%S'), "metrics": {metric.name: metric.snapshot() for metric in metrics}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, content_type = render().encode(), "text/plain; version=0.0.4"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body, content_type = json.dumps(snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server = None
+_stop = threading.Event()
+_snapshotter = None
+
+
+def serve(port, host="127.0.0.1"):
+
+    ## Prometheus endpoint at http://host:port/metrics (and the JSON snapshot at /metrics.json).
+    ## There is no authentication, so it only listens on loopback unless another host is given.
+
+    global _server
+    _server = ThreadingHTTPServer((host, port), _Handler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
+
+
+def writeSnapshot(path=SNAPSHOT_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=1)
+    os.replace(tmp, path)
+
+
+def startSnapshots(interval, path=SNAPSHOT_FILE):
+    global _snapshotter
+
+    def loop():
+        while not _stop.wait(interval):
+            try:
+                writeSnapshot(path)
+            except OSError:
+                pass
+
+    _stop.clear()
+    _snapshotter = threading.Thread(target=loop, name="metrics-snapshot", daemon=True)
+    _snapshotter.start()
+
+
+def stop(path=SNAPSHOT_FILE):
+
+    ## Final snapshot on exit, so the file always covers the whole run
+
+    global _server, _snapshotter
+
+    _stop.set()
+    if _snapshotter is not None:
+        _snapshotter.join()
+        _snapshotter = None
+        try:
+            writeSnapshot(path)
+        except OSError:
+            pass
+
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
@@ -0,0 +1,123 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+## Local cache of parsed dataset listing pages. Each page keeps its ETag/Last-Modified validators and a
+## hash of the body, so a re-crawl can send a conditional request and reuse the stored file list
+## when the server answers 304 or returns the same bytes again.
+
+CACHE_FILE = "page_cache.db"
+
+_conn = None
+_db_lock = threading.RLock()
+
+
+def open_cache(path=CACHE_FILE):
+    global _conn
+
+    with _db_lock:
+        if _conn is not None:
+            return _conn
+
+        _conn = sqlite3.connect(path, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.row_factory = sqlite3.Row
+
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                dataset INTEGER NOT NULL,
+                page INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                files TEXT NOT NULL,
+                pagination INTEGER NOT NULL,
+                has_next INTEGER NOT NULL,
+                fetched_at TEXT,
+                PRIMARY KEY (dataset, page)
+            )
+        """)
+        _conn.commit()
+
+        return _conn
+
+
+def _db():
+    return _conn if _conn is not None else open_cache()
+
+
+def lookup(dataset, page):
+
+    ## Cached entry for a listing page, with the parsed listing under "listing", or None
+
+    with _db_lock:
+        row = _db().execute("SELECT * FROM pages WHERE dataset = ? AND page = ?", (dataset, page)).fetchone()
+
+    if row is None:
+        return None
+
+    entry = dict(row)
+    entry["listing"] = {
+        "files": json.loads(row["files"]),
+        "pagination": bool(row["pagination"]),
+        "has_next": bool(row["has_next"]),
+        "access_denied": False,
+        "generating_files": False,
+    }
+    return entry
+
+
+def conditionalHeaders(entry):
+    headers = {}
+    if entry is None:
+        return headers
+    if entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def store(dataset, page, response, content_hash, listing):
+    with _db_lock:
+        db = _db()
+        db.execute(
+            "INSERT OR REPLACE INTO pages (dataset, page, etag, last_modified, content_hash, files, pagination, has_next, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                dataset,
+                page,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                content_hash,
+                json.dumps(listing["files"]),
+                int(listing["pagination"]),
+                int(listing["has_next"]),
+                time.strftime('%Y-%m-%d %H:%M:%S'),
+            )
+        )
+        db.commit()
+
+
+def touch(dataset, page):
+
+    ## Page revalidated without changes (304 or same hash)
+
+    with _db_lock:
+        db = _db()
+        db.execute(
+            "UPDATE pages SET fetched_at = ? WHERE dataset = ? AND page = ?",
+            (time.strftime('%Y-%m-%d %H:%M:%S'), dataset, page)
+        )
+        db.commit()
+
+
+def close():
+    global _conn
+
+    with _db_lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
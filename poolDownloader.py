@@ -1,15 +1,22 @@
+import json
 import os
 import random
 import threading
 import queue
 import time
 import requests
-from rich.progress import Progress, BarColumn, DownloadColumn, TransferSpeedColumn, TimeRemainingColumn
-from rich.live import Live
-from rich.console import Console
-from rich.layout import Layout
-from rich.panel import Panel
-from rich.text import Text
+import fileManifest
+import contentStore
+import metrics
+import logWriter
+import postProcess
+import rateLimiter
+import storageLayout
+import transport
+import workQueue
+from contextlib import nullcontext
+
+# Rich is imported by the display functions that draw with it, headless runs never load it
 
 
 tryExt = [ # alternate file extensions to use in case a pdf shows "No Images Produced", in order of occurance
@@ -29,9 +36,9 @@ tryExt = [ # alternate file extensions to use in case a pdf shows "No Images Pro
     ".3gp",
     ".ts",
     ".xls",
-    ".xlsx"
+    ".xlsx",
     ".db",
-    ".pluginpayloadattachment"
+    ".pluginpayloadattachment",
 
     ## some more filetypes, haven't been found yet but are common
 
@@ -48,7 +55,7 @@ tryExt = [ # alternate file extensions to use in case a pdf shows "No Images Pro
     ".tif", ".tiff", ".webp", ".heic", ".raw",
     ".rdf", ".nt", ".ttl", ".xlsm", ".docm", ".pptm",
     ".indd", ".idml", ".qxd",
-    ".rtx", ".asc", ".cer", ".cert", ".sig"
+    ".rtx", ".asc", ".cer", ".cert", ".sig",
     ".psd", ".ai", ".eps", ".svg",
     ".zip", ".rar", ".7z", ".tar", ".gz",
     ".tgz", ".tbz", ".tbz2", ".bz2",
@@ -72,6 +79,52 @@ def randomDelay(delay):
     delay = delay / 1000  # convert ms to seconds
     time.sleep(delay * (0.1 + random.random()))  # add some randomness to the delay to further reduce scraper detection
 
+def pace(delay):
+    # per-thread pacing, only needed when the shared rate limiter is not doing it for every request
+    if not rateLimiter.active():
+        randomDelay(delay)
+
+# Learned probe order: hit counts per dataset, loaded from the manifest once and kept in memory
+_alt_stats = None
+_alt_stats_lock = threading.Lock()
+
+def orderedExtensions(dataset):
+
+    ## tryExt reordered by how often each extension was the alternate in this dataset,
+    ## then across all datasets, falling back to the tryExt order for ties
+
+    global _alt_stats
+    with _alt_stats_lock:
+        if _alt_stats is None:
+            _alt_stats = fileManifest.alternateStats()
+
+        local = _alt_stats.get(dataset, {})
+        overall = {}
+        for counts in _alt_stats.values():
+            for ext, hits in counts.items():
+                overall[ext] = overall.get(ext, 0) + hits
+
+    position = {ext: i for i, ext in enumerate(tryExt)}
+    return sorted(tryExt, key=lambda ext: (-local.get(ext, 0), -overall.get(ext, 0), position[ext]))
+
+def recordAlternateHit(dataset, ext):
+    global _alt_stats
+    with _alt_stats_lock:
+        if _alt_stats is None:
+            _alt_stats = fileManifest.alternateStats()
+        counts = _alt_stats.setdefault(dataset, {})
+        counts[ext] = counts.get(ext, 0) + 1
+    fileManifest.recordAlternateHit(dataset, ext)
+
+def knownAlternate(poolObject):
+
+    ## Alternate already recorded for this placeholder on an earlier run, if any
+
+    entry = fileManifest.lookup(poolObject[2])
+    if entry is not None and entry["alt_url"]:
+        return (poolObject[0], poolObject[1], entry["alt_url"])
+    return None
+
 def alternateUrl(poolObject, session, timeBetweenFiles):
 
     
@@ -79,39 +132,49 @@ def alternateUrl(poolObject, session, timeBetweenFiles):
     _filepage = poolObject[1]
     _url = poolObject[2]
 
-    for ext in tryExt:
+    known = knownAlternate(poolObject)
+    if known:
+        metrics.alternate_probes.observe(0)
+        return known
+
+    probes = 0
+    for ext in orderedExtensions(_dataset):
         altUrl = _url.replace(".pdf", ext)
+        probes += 1
         try:
             r = session.head(altUrl, allow_redirects=True, timeout=5)
         except requests.RequestException:
             continue
 
         if r.status_code == 200:
+            metrics.alternate_probes.observe(probes)
+            recordAlternateHit(_dataset, ext)
             log_event(
                 alt_log,
-                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Alternate found, Dataset {_globalDataset} | Page {_filepage} | {altUrl}"
+                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Alternate found, Dataset {_globalDataset} | Page {_filepage} | {altUrl}",
+                event="alternate_found", dataset=_dataset, page=_filepage, url=altUrl, source=_url, probes=probes
             )
             return (_dataset, _filepage, altUrl)  # return as tuple with page and dataset info for state saving
 
         # Explicitly ignore rate limiting and forbidden during probing
         if r.status_code in (403, 429, 503):
-            randomDelay(500)  # Random delay for rate limiting errors
+            pace(500)  # Random delay for rate limiting errors
             continue
-        randomDelay(timeBetweenFiles)    
+        pace(timeBetweenFiles)
 
+    metrics.alternate_probes.observe(probes)
     incrementUnknownAlternateCount()
 
     log_event(
         alt_log,
-        f"{time.strftime('%Y-%m-%d %H:%M:%S')} | No alternate found, Dataset {_globalDataset} | Page {_filepage} | {_url}"
+        f"{time.strftime('%Y-%m-%d %H:%M:%S')} | No alternate found, Dataset {_globalDataset} | Page {_filepage} | {_url}",
+        event="no_alternate", dataset=_dataset, page=_filepage, url=_url, probes=probes
     )
 
     return None
 
 
 
-console = Console()
-
 SENTINEL = object()
 
 _producer_done = threading.Event()
@@ -120,8 +183,6 @@ _start_event = threading.Event()
 _producer_done.clear()
 _start_event.clear()
 
-_log_lock = threading.Lock()
-
 def producerDone():
     _producer_done.set()
 
@@ -131,9 +192,13 @@ def signalStart():
 def isStarted():
     return _start_event.is_set()
 
-# Thread-safe pool
-_pool = queue.Queue()
+# Thread-safe pool: bounded, (dataset, page) ordered, blocking on both ends
+_pool = workQueue.WorkQueue(on_wait=metrics.queue_wait_seconds.observe)
 _workers = []
+
+# Alternate probing stage, fed with placeholders by the download workers
+_probe_queue = queue.Queue()
+_probers = []
 # Header
 
 _download_count = 0
@@ -158,6 +223,10 @@ alternateCount = 0
 unknownAlternateCount = 0
 
 def head_with_retry(session, url, retries=3, base_delay=0.5):
+    with metrics.head_seconds.time():
+        return _head_with_retry(session, url, retries, base_delay)
+
+def _head_with_retry(session, url, retries, base_delay):
     for attempt in range(retries):
         try:
             r = session.head(url, allow_redirects=True, timeout=5)
@@ -168,7 +237,7 @@ def head_with_retry(session, url, retries=3, base_delay=0.5):
 
             # Rate limiting or temporary denial
             if r.status_code in (403, 429, 503):
-                randomDelay(base_delay )
+                pace(base_delay)
                 continue
 
             # Other non-200 responses return immediately
@@ -187,41 +256,74 @@ def setDatasetInfo(dataset, globalPage):
         _globalDataset = dataset
         _globalPage = globalPage
 
-def log_event(log_path, message):
-    with _log_lock:
-        with open(log_path, "a", encoding="utf-8") as f:
-            f.write(message + "\n")
+def log_event(log_path, message, **fields):
+    # queued for the background writer, fields go into the JSONL record (see logWriter)
+    logWriter.write(log_path, message, **fields)
+
+def httpStatus(error):
+    # status code carried by a requests/aiohttp error, if any
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) or getattr(error, "status", None)
+
+def retryable(error):
+    # network errors, timeouts, 408, 429 and 5xx can pass; any other 4xx (404, 410, ...) is final
+    status = httpStatus(error)
+    return status is None or status in (408, 429) or status >= 500
 
 def incrementDownloadCount():
     global _download_count
     with _counter_lock:
         _download_count += 1
+    metrics.events.inc(labels={"event": "download"})
 
 def incrementForbiddenCount():   
     global forbiddens
     with _counter_lock:
         forbiddens += 1
+    metrics.events.inc(labels={"event": "forbidden"})
 
 def incrementErrorCount():   
     global errors
     with _counter_lock:
         errors += 1
+    metrics.events.inc(labels={"event": "error"})
 
 def incrementAlternateCount():
     global alternateCount
     with _counter_lock:
         alternateCount += 1
+    metrics.events.inc(labels={"event": "alternate"})
 
 def incrementUnknownAlternateCount():
     global unknownAlternateCount
     with _counter_lock:
         unknownAlternateCount += 1
+    metrics.events.inc(labels={"event": "unknown_alternate"})
+
+
+def setPoolLimit(maxsize):
+    _pool.maxsize = maxsize
+
+def useSpillQueue(path, window, maxsize=0):
+
+    ## Replace the in-memory pool with a spillQueue.SpillQueue before the workers start:
+    ## window items in memory, the rest on disk. Returns the items recovered from the last run.
+
+    global _pool
+    import spillQueue
+    _pool = spillQueue.SpillQueue(path, window=window, maxsize=maxsize, on_wait=metrics.queue_wait_seconds.observe)
+    return _pool.recovered
 
+def releasePool():
+    _pool.release()
 
-def updatePool(poolObjects): ## force as tuple
+def updatePool(poolObjects, force=False): ## force as tuple
     _poolObjects = [(obj[0], obj[1], obj[2]) for obj in poolObjects] # ensure it's a list of triples
+    fileManifest.recordDiscovered(_poolObjects)
     for obj in _poolObjects:
-        _pool.put(obj)
+        if not force and _pool.full():
+            signalStart()  # a full pool has to be drained, or the producer would block forever
+        _pool.put(obj, force=force)  # blocks while the pool is full
 
 
 def poolSize():
@@ -234,30 +336,452 @@ def poolSize():
 
 def empty_pool(numWorkers):
 
-    ## Immediately remove all pending items from the pool
+    ## Cancel: immediately remove all pending items from the pool and stop the workers.
+    ## Dropped files stay pending in the manifest and are picked up by the next run.
 
-    removed = 0
+    removed = _pool.cancel()
 
+    for t in _workers:
+        if t is not threading.current_thread():
+            t.join()
+
+    stopProbers()
+
+    return removed
+
+def finish_pool():
+
+    ## Clean shutdown once discovery is done: wait until every queued download and every
+    ## probe has finished (probes can queue alternates), then let the workers exit
+
+    signalStart()
     while True:
-        try:
-            _pool.get_nowait()
-            _pool.task_done()
-            removed += 1
-        except queue.Empty:
+        _pool.join()
+        _probe_queue.join()
+        if _pool.unfinished() == 0:
             break
 
-    for _ in _workers:
-        _pool.put(SENTINEL)
+    _pool.close()
 
     for t in _workers:
-        t.join()
+        if t is not threading.current_thread():
+            t.join()
 
-    return removed
+    stopProbers()
 
 def wait_for_completion():
     _pool.join()
 
-def _download_worker(worker_id, out_dir, session, progress, timeBetweenFiles, trustLocalFiles):
+def queueWait():
+    ## (average, max) seconds items waited in the pool before a worker took them
+    return _pool.averageWait(), _pool.wait_max
+
+def probeQueueSize():
+    return _probe_queue.qsize()
+
+def queueProbe(poolObject, pooled=False):
+    # pooled: the item came from the download pool, which counts it as unfinished (and the spill
+    # queue keeps it on disk) until the probe is done
+    _probe_queue.put((poolObject, pooled))
+
+def _probe_worker(session, timeBetweenProbes):
+
+    ## Resolves placeholders into alternates off the download path, so a placeholder
+    ## never holds up a download worker for the length of a probe sequence
+
+    while True:
+        probe = _probe_queue.get()
+
+        if probe is SENTINEL:
+            _probe_queue.task_done()
+            break
+
+        poolObject, pooled = probe
+
+        try:
+            altObject = alternateUrl(poolObject, session, timeBetweenProbes)
+            if altObject:
+                incrementAlternateCount()
+                # discovered (committed as pending) before the placeholder is marked probed, so a
+                # crash in between can lose neither the alternate nor the probe
+                updatePool([altObject], force=True)  # add alternate to pool with page info for state saving
+            fileManifest.markStatus(poolObject[2], fileManifest.PLACEHOLDER, alt_url=altObject[2] if altObject else None)
+        except Exception as e:
+            log_event(
+                alt_log,
+                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Probe failed, Dataset {poolObject[0]} | Page {poolObject[1]} | {poolObject[2]} | {type(e).__name__} | {str(e)}",
+                event="probe_failed", dataset=poolObject[0], page=poolObject[1], url=poolObject[2],
+                exception=type(e).__name__, error=str(e)
+            )
+        finally:
+            if pooled:
+                _pool.task_done(poolObject)
+            _probe_queue.task_done()
+
+def startProbers(session, probeWorkers=2, timeBetweenProbes=40):
+    for _ in range(max(probeWorkers, 1)):
+        t = threading.Thread(target=_probe_worker, args=(session, timeBetweenProbes), daemon=True)
+        t.start()
+        _probers.append(t)
+
+def stopProbers():
+
+    ## Drop placeholders that are still waiting; they stay "probing" in the manifest and
+    ## the next crawl or fetch hands them back to the probe stage (fileManifest.unprobedPlaceholders)
+
+    while True:
+        try:
+            _, pooled = _probe_queue.get_nowait()
+        except queue.Empty:
+            break
+        if pooled:
+            _pool.task_done()  # without the item: a spill queue keeps its row for the next run
+        _probe_queue.task_done()
+
+    for _ in _probers:
+        _probe_queue.put(SENTINEL)
+
+    for t in _probers:
+        t.join()
+
+    _probers.clear()
+
+def _content_range_start_total(r):
+    # "bytes 1000-4999/5000" -> (1000, 5000), total is None when the server sends "*"
+    try:
+        span, total = r.headers.get("Content-Range", "").split(" ", 1)[1].split("/")
+        return int(span.split("-")[0]), (None if total == "*" else int(total))
+    except (IndexError, ValueError):
+        return None, None
+
+def _unsatisfiable_total(r):
+    # "bytes */5000" on a 416 -> 5000, the full length of the remote file
+    try:
+        return int(r.headers.get("Content-Range", "").rsplit("/", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+def finishCompletePart(r, part, path, offset):
+
+    ## On a 416, a .part file that already has the full length (the last run stopped before the
+    ## rename) is renamed into place. Returns (total, sha256), or None when it has to be dropped.
+
+    total = _unsatisfiable_total(r)
+    if total is None or total != offset:
+        return None
+    sha256 = contentStore.hashFile(part)
+    os.replace(part, path)
+    return total, sha256
+
+PLACEHOLDER_SIZE = 2433  # size of the "No Images Produced" ReportLab PDF
+PEEK_BYTES = 4096        # how much of the body the classifier looks at
+
+def isPlaceholder(header):
+    ## "No Images Produced" placeholder PDFs are generated by ReportLab
+    return header.startswith(b"%PDF") and b"ReportLab PDF Library" in header
+
+def placeholderSized(size):
+    return size is not None and 0.9 < size / PLACEHOLDER_SIZE < 1.1
+
+def classifyPlaceholder(content_length, head, complete):
+
+    ## Inline placeholder classifier, run on the response while it streams.
+    ## Returns True (placeholder), False (real file) or None (needs more of the body).
+
+    # a Content-Length far from the placeholder size is a real file, no need to look at the body
+    if content_length is not None and not placeholderSized(content_length):
+        return False
+
+    if len(head) < PEEK_BYTES and not complete:
+        return None
+
+    return isPlaceholder(head)
+
+def recordTransfer(size, seconds):
+    metrics.download_seconds.observe(seconds)
+    metrics.download_bytes.inc(size)
+    if seconds > 0:
+        metrics.download_throughput.observe(size / seconds)
+
+class AlreadyDownloading(Exception):
+    ## Another worker is writing this .part file right now; it records the outcome
+    pass
+
+_parts_in_flight = set()
+_parts_lock = threading.Lock()
+
+def claimPart(part):
+    with _parts_lock:
+        if part in _parts_in_flight:
+            return False
+        _parts_in_flight.add(part)
+        return True
+
+def releasePart(part):
+    with _parts_lock:
+        _parts_in_flight.discard(part)
+
+def download_resumable(session, url, path, on_progress=None, retries=3, base_delay=1000):
+
+    ## Stream url into path + ".part" and continue with a Range request after errors instead of
+    ## starting over. The part file only replaces path once its size matches the full length,
+    ## so a truncated transfer is never left behind under the final name.
+    ## Placeholders are recognised from Content-Length and the first bytes and never written.
+    ## Returns (total, bytes, sha256, placeholder), the hash computed while streaming.
+    ## Raises AlreadyDownloading when another worker holds the same .part file.
+
+    part = path + ".part"
+    if not claimPart(part):
+        raise AlreadyDownloading(part)
+    try:
+        return _download_part(session, url, path, part, on_progress, retries, base_delay)
+    finally:
+        releasePart(part)
+
+def _download_part(session, url, path, part, on_progress, retries, base_delay):
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    last_error = None
+
+    for attempt in range(retries):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+
+        try:
+            requested = time.monotonic()
+            with session.get(url, stream=True, headers=headers, timeout=(10, 60)) as r:
+                metrics.download_ttfb_seconds.observe(time.monotonic() - requested)
+
+                if r.status_code == 416:  # nothing left after offset: complete, or no longer matching
+                    finished = finishCompletePart(r, part, path, offset)
+                    if finished:
+                        return finished[0], offset, finished[1], False
+                    os.remove(part)
+                    continue
+
+                r.raise_for_status()
+
+                if r.status_code == 206:
+                    start, total = _content_range_start_total(r)
+                    if start != offset:
+                        os.remove(part)
+                        continue
+                    mode = "ab"
+                    hasher = contentStore.newHasher(part)
+                else:
+                    # server ignored the Range header, so the body is the whole file
+                    offset = 0
+                    total = int(r.headers.get("Content-Length", 0)) or None
+                    mode = "wb"
+                    hasher = contentStore.newHasher()
+
+                written = offset
+                if on_progress:
+                    on_progress(total, written)
+
+                chunks = r.iter_content(chunk_size=chunkSize(total))
+
+                # hold back the first bytes of a fresh transfer until the classifier has decided
+                head = b""
+                verdict = False if mode == "ab" else None
+                while verdict is None:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        verdict = classifyPlaceholder(total, head, complete=True)
+                        break
+                    head += chunk
+                    verdict = classifyPlaceholder(total, head, complete=False)
+
+                if verdict:
+                    hasher.update(head)
+                    return total, len(head), hasher.hexdigest(), True
+
+                with open(part, mode) as f:
+                    if head:
+                        f.write(head)
+                        hasher.update(head)
+                        written += len(head)
+
+                    for chunk in chunks:
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        written += len(chunk)
+                        if on_progress:
+                            on_progress(total, written)
+
+            if total is None or written == total:
+                os.replace(part, path)
+                recordTransfer(written - offset, time.monotonic() - requested)
+                return total, written, hasher.hexdigest(), False
+
+            last_error = OSError(f"Incomplete transfer, {written} of {total} bytes")
+
+        except (requests.RequestException, OSError) as e:
+            if not retryable(e):
+                raise  # e.g. 404: asking again only costs requests and sleep
+            last_error = e
+
+        randomDelay(base_delay * (attempt + 1))
+
+    raise last_error if last_error else OSError(f"Could not download {url}")
+
+# Display: the Rich UI, or periodic status lines on stdout when nobody is watching (headless)
+
+_headless = False
+_status_interval = 30.0
+_status_format = "text"  # "text" or "json"
+
+REFRESH_PER_SECOND = 4     # Rich redraws per second
+PROGRESS_INTERVAL = 0.25   # seconds between progress bar updates of one transfer
+MIN_CHUNK = 8 * 1024
+MAX_CHUNK = 1024 * 1024
+
+def setDisplay(headless=False, status_interval=30, status_format="text"):
+    global _headless, _status_interval, _status_format
+    _headless = headless
+    _status_interval = float(status_interval)
+    _status_format = status_format
+
+def isHeadless():
+    return _headless
+
+def statusSnapshot():
+    with _counter_lock:
+        status = {
+            "dataset": _globalDataset,
+            "page": _globalPage,
+            "downloaded": _download_count,
+            "forbiddens": forbiddens,
+            "errors": errors,
+            "alternates": alternateCount,
+            "unknown_alternates": unknownAlternateCount,
+        }
+    status["pool_size"] = poolSize()
+    status["probe_queue"] = probeQueueSize()
+    status["rate"] = rateLimiter.currentRate()
+    status["queue_wait"] = round(queueWait()[0], 3)
+    status["connection_reuse"] = transport.connectionStats()["reuse"]
+    return status
+
+def statusLine():
+    status = statusSnapshot()
+    if _status_format == "json":
+        return json.dumps({"time": time.strftime('%Y-%m-%d %H:%M:%S'), **status})
+    rate = f" | Rate: {status['rate']:.1f}/s" if status["rate"] is not None else ""
+    reuse = f" | Reuse: {status['connection_reuse']:.0%}" if status["connection_reuse"] is not None else ""
+    return (f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Dataset: {status['dataset']} | Page: {status['page']} | "
+            f"Files Downloaded: {status['downloaded']} | Pool Size: {status['pool_size']} | Probe Queue: {status['probe_queue']} | "
+            f"Forbiddens: {status['forbiddens']} | Errors: {status['errors']} | Alternates: {status['alternates']} | "
+            f"Unknown Alternates: {status['unknown_alternates']}{rate} | Queue Wait: {status['queue_wait']:.1f}s{reuse}")
+
+def printStatus():
+    print(statusLine(), flush=True)
+
+def headerPanel():
+    from rich.panel import Panel
+    from rich.text import Text
+
+    rate = rateLimiter.currentRate()
+    rate_text = f" | Rate: {rate:.1f}/s" if rate is not None else ""
+    rate_text += f" | Queue Wait: {queueWait()[0]:.1f}s"
+    with _counter_lock:
+        header_text = Text(
+            f"Dataset: {_globalDataset} | Page: {_globalPage} | Files Downloaded: {_download_count} | Pool Size: {poolSize()} | Probe Queue: {probeQueueSize()} | Forbiddens: {forbiddens} | Errors: {errors} | Alternates: {alternateCount} | Unknown Alternates: {unknownAlternateCount}{rate_text}",
+            style="bold white"
+        )
+    return Panel(header_text)
+
+class NullProgress:
+
+    ## Stands in for rich's Progress in headless mode
+
+    def add_task(self, *args, **kwargs):
+        return 0
+
+    def update(self, *args, **kwargs):
+        pass
+
+    def advance(self, *args, **kwargs):
+        pass
+
+def newDisplay(time_remaining=True):
+
+    ## (progress, layout, live) for a download run: Rich progress bars under the header panel, or
+    ## a NullProgress, no layout and a no-op context when headless, without importing Rich at all
+
+    if _headless:
+        return NullProgress(), None, nullcontext()
+
+    from rich.layout import Layout
+    from rich.live import Live
+    from rich.progress import BarColumn, DownloadColumn, Progress, TimeRemainingColumn, TransferSpeedColumn
+
+    columns = ["[bold blue]{task.description}", BarColumn(), DownloadColumn(), TransferSpeedColumn()]
+    if time_remaining:
+        columns.append(TimeRemainingColumn())
+    progress = Progress(*columns)
+
+    layout = Layout()
+    layout.split_column(
+        Layout(name="header", size=3),
+        Layout(progress, name="body")
+    )
+    return progress, layout, Live(layout, refresh_per_second=REFRESH_PER_SECOND)
+
+def throttledProgress(progress, task_id, interval=PROGRESS_INTERVAL):
+
+    ## on_progress callback for download_resumable that redraws the bar at most every
+    ## interval seconds, plus once when the transfer completes
+
+    last = [0.0]
+
+    def update(total, written):
+        now = time.monotonic()
+        if now - last[0] >= interval or (total is not None and written >= total):
+            last[0] = now
+            progress.update(task_id, total=total, completed=written)
+
+    return update
+
+class ProgressBatcher:
+
+    ## Adds up progress.advance calls and hands them on at most every interval seconds
+
+    def __init__(self, progress, task_id, interval=PROGRESS_INTERVAL):
+        self.progress = progress
+        self.task_id = task_id
+        self.interval = interval
+        self.pending = 0
+        self.last = 0.0
+
+    def advance(self, amount):
+        self.pending += amount
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.flush(now)
+
+    def flush(self, now=None):
+        if self.pending:
+            self.progress.advance(self.task_id, self.pending)
+            self.pending = 0
+        self.last = now if now is not None else time.monotonic()
+
+def chunkSize(total):
+
+    ## Read size for a transfer: around 64 reads per file, between 8 KiB and 1 MiB.
+    ## Small files keep small reads so placeholders are classified from the first chunk.
+
+    if total is None:
+        return 64 * 1024
+    size = MIN_CHUNK
+    while size < MAX_CHUNK and size * 64 < total:
+        size *= 2
+    return size
+
+def _download_worker(worker_id, out_dir, session, progress, timeBetweenFiles, trustLocalFiles, downloadRetries=3, verifyHashes=False):
 
     task_id = progress.add_task(f"Worker {worker_id}", total=1)
     _start_event.wait()
@@ -266,13 +790,9 @@ def _download_worker(worker_id, out_dir, session, progress, timeBetweenFiles, tr
 
     while True:
 
-        try:   
-            poolObject = _pool.get(timeout=1)  # get the tuple (url, page)
-        except queue.Empty:
-            continue
+        poolObject = _pool.get()  # get the tuple (dataset, page, url), blocks until there is work
 
-        if poolObject is SENTINEL:
-            _pool.task_done()
+        if poolObject is None:  # pool closed and drained, or cancelled
             break
 
 
@@ -283,8 +803,23 @@ def _download_worker(worker_id, out_dir, session, progress, timeBetweenFiles, tr
         setLastLocation((_dataset,_filepage))
 
         filename = os.path.basename(_url)
-        path = os.path.join(out_dir, f"Dataset {_dataset}", filename)
+        path = storageLayout.filePath(out_dir, _dataset, filename)
+
+
+        # finished on a previous run, no request needed
+        if fileManifest.isComplete(_url, path) and (not verifyHashes or contentStore.verify(_url, path)):
+
+            metrics.files.inc(labels={"result": "skipped"})
+            progress.update(
+                task_id,
+                total=0,
+                completed=0,
+                description=f"[yellow]W{worker_id}: {filename}[/yellow]"
+            )
 
+            incrementDownloadCount()
+            _pool.task_done(poolObject)
+            continue
 
         if(trustLocalFiles):
                 
@@ -299,9 +834,12 @@ def _download_worker(worker_id, out_dir, session, progress, timeBetweenFiles, tr
                     description=f"[yellow]W{worker_id}: {filename}[/yellow]"
                 )
 
+                fileManifest.markStatus(_url, fileManifest.DONE, local_size=os.path.getsize(path))
+                postProcess.submit(_url, path)
+                metrics.files.inc(labels={"result": "skipped"})
                 incrementDownloadCount()
-                randomDelay(timeBetweenFiles)
-                _pool.task_done()
+                pace(timeBetweenFiles)
+                _pool.task_done(poolObject)
                 continue
         else:
 
@@ -317,7 +855,7 @@ def _download_worker(worker_id, out_dir, session, progress, timeBetweenFiles, tr
                             # Skip if identical and not the small "No Images Produced" PDF
                             if (
                                 local_size == remote_size and
-                                not (0.9 < remote_size / 2433 < 1.1)
+                                not placeholderSized(remote_size)
                             ):
                                 progress.update(
                                     task_id,
@@ -325,38 +863,39 @@ def _download_worker(worker_id, out_dir, session, progress, timeBetweenFiles, tr
                                     completed=remote_size,
                                     description=f"[yellow]W{worker_id}: {filename}[/yellow]"
                                 )
+                                fileManifest.markStatus(_url, fileManifest.DONE, remote_size=remote_size, local_size=local_size)
+                                postProcess.submit(_url, path)
+                                metrics.files.inc(labels={"result": "skipped"})
                                 incrementDownloadCount()
-                                randomDelay(timeBetweenFiles)
-                                _pool.task_done()
+                                pace(timeBetweenFiles)
+                                _pool.task_done(poolObject)
                                 continue
                 except Exception:
                     pass
 
         try:
-            with session.get(_url, stream=True) as r:
-                r.raise_for_status()
-                total = int(r.headers.get("Content-Length", 0))
-
-                progress.update(
-                    task_id,
-                    total=total,
-                    completed=0,
-                    description=f"[cyan]W{worker_id}: {filename}[/cyan]"
-                )
+            progress.update(
+                task_id,
+                total=None,
+                completed=0,
+                description=f"[cyan]W{worker_id}: {filename}[/cyan]"
+            )
 
-                os.makedirs(os.path.dirname(path), exist_ok=True)
+            started = time.monotonic()
+            total, bytes_written, sha256, placeholder = download_resumable(
+                session, _url, path,
+                on_progress=throttledProgress(progress, task_id),
+                retries=downloadRetries,
+            )
 
-                bytes_written = 0
-                with open(path, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if not chunk:
-                            continue
-                        f.write(chunk)
-                        bytes_written += len(chunk)
-                        progress.update(task_id, completed=bytes_written)
+        except AlreadyDownloading:
+            _pool.task_done(poolObject)
+            continue
 
         except Exception as e:
             incrementErrorCount()
+            metrics.files.inc(labels={"result": "failed"})
+            fileManifest.markStatus(_url, fileManifest.FAILED)
             progress.update(
                 task_id,
                 description=f"[red]W{worker_id}: {filename}[/red]"
@@ -364,89 +903,88 @@ def _download_worker(worker_id, out_dir, session, progress, timeBetweenFiles, tr
 
             log_event(
                 failed_log,
-                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Dataset {_dataset} | Page {_filepage} | {_url} | {type(e).__name__} | {str(e)}"
+                f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Dataset {_dataset} | Page {_filepage} | {_url} | {type(e).__name__} | {str(e)}",
+                event="download_failed", dataset=_dataset, page=_filepage, url=_url, status=httpStatus(e),
+                exception=type(e).__name__, error=str(e), seconds=round(time.monotonic() - started, 3)
             )
 
-            _pool.task_done()
+            _pool.task_done(poolObject)
             continue
 
-        # ---- Download complete at this point ----
-        progress.update(
-            task_id,
-            description=f"[green]W{worker_id}: {filename}[/green]"
-        )
-
         setLastLocation((_dataset,_filepage))
-        incrementDownloadCount()
 
-        # Mark task complete immediately
-        _pool.task_done()
+        if placeholder:
+            # recognised while streaming, nothing was written; the probe stage looks for the alternate
+            progress.update(
+                task_id,
+                description=f"[magenta]W{worker_id}: {filename}[/magenta]"
+            )
+            fileManifest.markStatus(_url, fileManifest.PROBING, remote_size=total, sha256=sha256)
+            metrics.files.inc(labels={"result": "placeholder"})
+            queueProbe(poolObject, pooled=True)  # the probe stage finishes the pool item
 
-        # ---- Post-processing OUTSIDE critical path ----
-        try:
-            with open(path, "rb") as f:
-                header = f.read(4096)
+        else:
+            # ---- Download complete at this point ----
+            progress.update(
+                task_id,
+                description=f"[green]W{worker_id}: {filename}[/green]"
+            )
 
-            if header.startswith(b"%PDF") and b"ReportLab PDF Library" in header:
-                altObject = alternateUrl(poolObject, session, timeBetweenFiles)
-                if altObject:
-                    incrementAlternateCount()
-                    _pool.put(altObject)  # add alternate to pool with page info for state saving
+            fileManifest.markStatus(_url, fileManifest.DONE, remote_size=total or None, local_size=bytes_written, sha256=sha256)
+            metrics.files.inc(labels={"result": "downloaded"})
 
-        except Exception:
-            pass
+            try:
+                contentStore.storeOnce(_url, path, sha256, bytes_written)  # duplicate content becomes a hardlink
+            except OSError:
+                pass
 
+            postProcess.submit(_url, path, sha256)  # validated on the process pool, this worker moves on
+            _pool.task_done(poolObject)
 
-        finally:
-            if timeBetweenFiles > 0:
-                randomDelay(timeBetweenFiles)
+        incrementDownloadCount()
+
+        if timeBetweenFiles > 0:
+            pace(timeBetweenFiles)
 
 
 
-def downloadFromPool(out_dir, workers=8, timeBetweenFiles=10, session=None, trustLocalFiles=False):
+def downloadFromPool(out_dir, workers=8, timeBetweenFiles=10, session=None, trustLocalFiles=False, downloadRetries=3,
+                     probeWorkers=2, timeBetweenProbes=None, verifyHashes=False):
+
     os.makedirs(out_dir, exist_ok=True)
 
-    progress = Progress(
-        "[bold blue]{task.description}",
-        BarColumn(),
-        DownloadColumn(),
-        TransferSpeedColumn(),
-        TimeRemainingColumn(),
-    )
+    progress, layout, live = newDisplay()
 
     log_dir = os.path.join("logs")
     os.makedirs(log_dir, exist_ok=True)
 
     global _workers
 
-    layout = Layout()
-
-
-    layout.split_column(
-        Layout(name="header", size=3),
-        Layout(progress, name="body")
-    )
+    with live:
 
-    with Live(layout, refresh_per_second=30):
+        startProbers(session, probeWorkers, timeBetweenFiles if timeBetweenProbes is None else timeBetweenProbes)
 
         # Start workers
         for i in range(workers):
             t = threading.Thread(
                 target=_download_worker,
-                args=(i, out_dir, session, progress, timeBetweenFiles, trustLocalFiles),
+                args=(i, out_dir, session, progress, timeBetweenFiles, trustLocalFiles, downloadRetries, verifyHashes),
             )
             t.start()
             _workers.append(t)
 
+        last_status = time.monotonic()
         while any(t.is_alive() for t in _workers):
-            with _counter_lock:
-                header_text = Text(
-                    f"Dataset: {_globalDataset} | Page: {_globalPage} | Files Downloaded: {_download_count} | Pool Size: {poolSize()} | Forbiddens: {forbiddens} | Errors: {errors} | Alternates: {alternateCount} | Unknown Alternates: {unknownAlternateCount}",
-                    style="bold white"
-                )
-
-            layout["header"].update(Panel(header_text))
-            layout["body"].size = min(workers, 16)
+            if _headless:
+                if time.monotonic() - last_status >= _status_interval:
+                    printStatus()
+                    last_status = time.monotonic()
+            else:
+                layout["header"].update(headerPanel())
+                layout["body"].size = min(workers, 16)
 
             randomDelay(200)  # Random delay to avoid busy waiting
 
+        if _headless:
+            printStatus()
+
@@ -0,0 +1,217 @@
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import contentStore
+import fileManifest
+import integrityAudit
+import metrics
+
+
+## Checks on finished downloads, run on a process pool so the CPU work never holds up a download
+## thread or competes with them for the GIL. The workers hand every file they finish to submit()
+## and move on; each stage runs in a worker process, and the result ("ok" or the first problem
+## found) is written to the file's validation column in the manifest, with problems also logged.
+##
+## Built-in stages: "pdf" (header and %%EOF trailer), "mime" (the first bytes match the file's
+## extension, which catches alternates that are really an error page or another format) and
+## "hash" (SHA-256 for files that were marked done without one, e.g. with trustLocalFiles).
+## Any other stage is named "module:function"; it gets (path, entry) in the worker process and
+## returns a problem string or None. entry holds url, path and sha256 and may be updated.
+
+STAGES = ("pdf", "mime", "hash")
+
+# alternatives per extension, each one (offset, bytes) pairs that must all match
+SIGNATURES = {
+    ".avi": (((0, b"RIFF"), (8, b"AVI ")),),
+    ".wav": (((0, b"RIFF"), (8, b"WAVE")),),
+    ".webp": (((0, b"RIFF"), (8, b"WEBP")),),
+    ".mp4": (((4, b"ftyp"),),),
+    ".m4a": (((4, b"ftyp"),),),
+    ".m4v": (((4, b"ftyp"),),),
+    ".3gp": (((4, b"ftyp"),),),
+    ".mov": (((4, b"ftyp"),), ((4, b"moov"),), ((4, b"mdat"),), ((4, b"wide"),), ((4, b"free"),)),
+    ".opus": (((0, b"OggS"),),),
+    ".vob": (((0, b"\x00\x00\x01\xba"),),),
+    ".ts": (((0, b"\x47"), (188, b"\x47")),),
+    ".wmv": (((0, b"\x30\x26\xb2\x75\x8e\x66\xcf\x11"),),),
+    ".mp3": (((0, b"ID3"),), ((0, b"\xff\xfb"),), ((0, b"\xff\xf3"),), ((0, b"\xff\xf2"),), ((0, b"\xff\xfa"),)),
+    ".amr": (((0, b"#!AMR"),),),
+    ".docx": (((0, b"PK\x03\x04"),),),
+    ".xlsx": (((0, b"PK\x03\x04"),),),
+    ".pptx": (((0, b"PK\x03\x04"),),),
+    ".docm": (((0, b"PK\x03\x04"),),),
+    ".xlsm": (((0, b"PK\x03\x04"),),),
+    ".pptm": (((0, b"PK\x03\x04"),),),
+    ".odt": (((0, b"PK\x03\x04"),),),
+    ".ods": (((0, b"PK\x03\x04"),),),
+    ".odp": (((0, b"PK\x03\x04"),),),
+    ".zip": (((0, b"PK\x03\x04"),), ((0, b"PK\x05\x06"),)),
+    ".doc": (((0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"),),),
+    ".xls": (((0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"),),),
+    ".ppt": (((0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"),),),
+    ".msg": (((0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"),),),
+    ".jpg": (((0, b"\xff\xd8\xff"),),),
+    ".jpeg": (((0, b"\xff\xd8\xff"),),),
+    ".png": (((0, b"\x89PNG\r\n\x1a\n"),),),
+    ".gif": (((0, b"GIF87a"),), ((0, b"GIF89a"),)),
+    ".tif": (((0, b"II*\x00"),), ((0, b"MM\x00*"),)),
+    ".tiff": (((0, b"II*\x00"),), ((0, b"MM\x00*"),)),
+    ".bmp": (((0, b"BM"),),),
+    ".psd": (((0, b"8BPS"),),),
+    ".rar": (((0, b"Rar!\x1a\x07"),),),
+    ".7z": (((0, b"7z\xbc\xaf\x27\x1c"),),),
+    ".gz": (((0, b"\x1f\x8b"),),),
+    ".tgz": (((0, b"\x1f\x8b"),),),
+    ".bz2": (((0, b"BZh"),),),
+    ".xz": (((0, b"\xfd7zXZ\x00"),),),
+    ".zst": (((0, b"\x28\xb5\x2f\xfd"),),),
+    ".sqlite": (((0, b"SQLite format 3\x00"),),),
+    ".sqlite3": (((0, b"SQLite format 3\x00"),),),
+    ".rtf": (((0, b"{\\rtf"),),),
+    ".ps": (((0, b"%!PS"),),),
+    ".exe": (((0, b"MZ"),),),
+    ".dll": (((0, b"MZ"),),),
+}
+SNIFF_BYTES = 256
+
+
+def checkPdf(path, entry):
+    if path.lower().endswith(".pdf"):
+        return integrityAudit.checkPdf(path)
+    return None
+
+
+def sniffMime(path, entry):
+    alternatives = SIGNATURES.get(os.path.splitext(path)[1].lower())
+    if alternatives is None:
+        return None  # nothing reliable to compare against
+
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+
+    for signature in alternatives:
+        if all(head[offset:offset + len(magic)] == magic for offset, magic in signature):
+            return None
+    return "mime_mismatch"
+
+
+def hashFile(path, entry):
+    if not entry.get("sha256"):
+        entry["sha256"] = contentStore.hashFile(path)
+
+
+_BUILTIN = {"pdf": checkPdf, "mime": sniffMime, "hash": hashFile}
+
+
+def _resolve(name):
+    if name in _BUILTIN:
+        return _BUILTIN[name]
+    module, _, function = name.partition(":")
+    return getattr(importlib.import_module(module), function)
+
+
+def process(entry, stages=STAGES):
+
+    ## Run the stages over one file, in a worker process. Returns (url, result, sha256).
+
+    try:
+        for name in stages:
+            problem = _resolve(name)(entry["path"], entry)
+            if problem:
+                return entry["url"], problem, entry.get("sha256")
+    except FileNotFoundError:
+        return entry["url"], "missing", None
+    except Exception as e:
+        return entry["url"], f"check_error: {type(e).__name__}", None
+    return entry["url"], "ok", entry.get("sha256")
+
+
+_pool = None
+_stages = STAGES
+_log = None
+_lock = threading.Lock()
+_idle = threading.Condition(_lock)
+_pending = 0
+
+
+def start(workers=2, stages=STAGES, log=None):
+
+    ## log(message, **fields) receives every file that fails a check
+
+    global _pool, _stages, _log
+    with _lock:
+        if _pool is not None or not stages:
+            return
+        _stages = tuple(stages)
+        _log = log
+        # spawned, not forked: the scraper has its download threads running by now
+        _pool = ProcessPoolExecutor(max_workers=max(1, int(workers)), mp_context=multiprocessing.get_context("spawn"))
+
+
+def active():
+    return _pool is not None
+
+
+def pending():
+    with _lock:
+        return _pending
+
+
+def submit(url, path, sha256=None):
+
+    ## Queue a finished file for checking, returns at once. A no-op unless start() was called.
+
+    global _pending
+    with _lock:
+        if _pool is None:
+            return
+        try:
+            future = _pool.submit(process, {"url": url, "path": path, "sha256": sha256}, _stages)
+        except RuntimeError:  # shutting down
+            return
+        _pending += 1
+    future.add_done_callback(_finished)
+
+
+def _finished(future):
+    global _pending
+    try:
+        if not future.cancelled():
+            url, result, sha256 = future.result()
+            fileManifest.recordCheck(url, result, sha256)
+            metrics.checks.inc(labels={"result": "ok" if result == "ok" else result.split(":")[0]})
+            if result != "ok" and _log is not None:
+                _log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Check failed: {result} | {url}", event="check_failed", url=url, status=result)
+    except Exception as e:
+        # a broken pool loses the result, the file is still done and verify can check it later
+        metrics.events.inc(labels={"event": "check_lost"})
+        if _log is not None:
+            _log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Check result lost | {type(e).__name__} | {e}", event="check_lost",
+                 exception=type(e).__name__, error=str(e))
+    finally:
+        with _lock:
+            _pending -= 1
+            _idle.notify_all()
+
+
+def drain(timeout=None):
+
+    ## Wait until every submitted file has been checked
+
+    with _lock:
+        return _idle.wait_for(lambda: _pending == 0, timeout)
+
+
+def stop():
+
+    ## Drop what has not started yet and wait for the running checks; dropped files stay unchecked
+
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
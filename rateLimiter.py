@@ -0,0 +1,130 @@
+import email.utils
+import random
+import threading
+import time
+import requests
+import metrics
+
+
+## One token bucket shared by every request to justice.gov: listing pages, HEAD checks, downloads
+## and alternate probes. The rate grows additively while responses succeed and is halved on
+## 403/429/503 (AIMD); a Retry-After header, or a default penalty, pauses every thread at once.
+
+THROTTLE_STATUSES = (403, 429, 503)
+
+
+class AdaptiveRateLimiter:
+
+    def __init__(self, rate=4.0, min_rate=0.2, max_rate=10.0, burst=None, increase=0.05, penalty=4.0):
+        self.rate = float(rate)             # current requests per second
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.increase = float(increase)     # requests per second added per successful response
+        self.penalty = float(penalty)       # seconds to pause on a throttle without Retry-After
+
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+        self.throttles = 0
+
+    def reserve(self):
+
+        ## Take one token and return how long the caller has to wait before sending
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+            self._tokens -= 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            wait = max(wait, self._paused_until - now)
+
+        # a little jitter so requests do not line up on a fixed interval
+        return wait * (0.9 + 0.2 * random.random()) if wait > 0 else 0.0
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def feedback(self, status, headers=None):
+        with self._lock:
+            now = time.monotonic()
+
+            if status in THROTTLE_STATUSES:
+                self.throttles += 1
+
+                # one decrease per second at most, many in-flight responses report the same throttle
+                if now - self._last_decrease > 1.0:
+                    self.rate = max(self.min_rate, self.rate / 2)
+                    self._last_decrease = now
+
+                retry_after = _retry_after_seconds(headers.get("Retry-After") if headers else None)
+                pause = retry_after if retry_after is not None else self.penalty
+                self._paused_until = max(self._paused_until, now + pause)
+                self._tokens = min(self._tokens, 0.0)
+
+            elif status < 400:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+def _retry_after_seconds(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+limiter = None
+
+
+def configure(enabled=True, **options):
+    global limiter
+    limiter = AdaptiveRateLimiter(**options) if enabled else None
+    return limiter
+
+
+def active():
+    return limiter is not None
+
+
+def reserve():
+    return limiter.reserve() if limiter is not None else 0.0
+
+
+def acquire():
+    if limiter is not None:
+        limiter.acquire()
+
+
+def feedback(status, headers=None):
+    metrics.responses.inc(labels={"status": status})
+    if limiter is not None:
+        limiter.feedback(status, headers)
+
+
+def currentRate():
+    return limiter.rate if limiter is not None else None
+
+
+class LimitedSession(requests.Session):
+
+    ## requests.Session that passes every request through the shared limiter
+
+    def request(self, method, url, *args, **kwargs):
+        acquire()
+        r = super().request(method, url, *args, **kwargs)
+        feedback(r.status_code, r.headers)
+        return r
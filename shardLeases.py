@@ -0,0 +1,156 @@
+import os
+import socket
+import threading
+import time
+
+import fileManifest
+import logWriter
+import metrics
+
+
+## Lease-based work claiming for sharded runs. Each shard claims one page range of a dataset at
+## a time under an expiring lease. The lease is renewed while the shard crawls the range and
+## downloads its files, and closed once all of them have finished. A shard that dies stops
+## renewing, so its ranges expire and are claimed, re-listed and finished by another shard.
+##
+## The leases live in one of two places. Shards on one host share the manifest itself (its
+## leases table, on a local filesystem: SQLite locking is not reliable on NFS/SMB). Shards on
+## several hosts each keep a local manifest and talk to a lease coordinator instead (see
+## leaseCoordinator), which owns the leases table and is the only process that writes it.
+
+owner = None
+_pages = 50
+_lease_seconds = 300.0
+
+_coordinator = None  # leaseCoordinator.Client, or None for the shared manifest
+_crawled = set()     # (dataset, start_page, end_page) this shard listed and has to finish, coordinator mode
+_crawled_lock = threading.Lock()
+
+_stop = threading.Event()
+_renewer = None
+
+
+def defaultShardId():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def start(shard_id=None, pages=50, lease_seconds=300, coordinator="", token=""):
+    global owner, _pages, _lease_seconds, _renewer, _coordinator
+
+    owner = shard_id or defaultShardId()
+    _pages = max(1, int(pages))
+    _lease_seconds = float(lease_seconds)
+
+    if coordinator:
+        import leaseCoordinator
+        _coordinator = leaseCoordinator.Client(coordinator, token)
+    else:
+        _coordinator = None
+
+    # ranges this shard id still holds from a run that was killed, claimable again
+    _release()
+
+    _stop.clear()
+    _renewer = threading.Thread(target=_renew, name="lease-renewer", daemon=True)
+    _renewer.start()
+    return owner
+
+
+def _renew():
+    while not _stop.wait(_lease_seconds / 3):
+        try:
+            if _coordinator is not None:
+                _coordinator.call("renew", owner=owner, seconds=_lease_seconds)
+            else:
+                fileManifest.renewLeases(owner, _lease_seconds)
+            _complete()
+        except Exception as e:
+            # a busy manifest or an unreachable coordinator is retried on the next tick, well inside the lease
+            metrics.events.inc(labels={"event": "lease_renew_failed"})
+            logWriter.write(os.path.join("logs", "failed_downloads.log"),
+                            f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Lease renewal failed | {type(e).__name__} | {e}",
+                            event="lease_renew_failed", shard=owner, exception=type(e).__name__, error=str(e))
+
+
+def _complete():
+
+    ## Close crawled ranges whose files have all finished
+
+    if _coordinator is None:
+        fileManifest.completeLeases(owner)
+        return
+
+    with _crawled_lock:
+        finished = [lease for lease in _crawled if fileManifest.rangeFinished(*lease)]
+    if finished:
+        _coordinator.call("close", owner=owner, ranges=[(dataset, start_page) for dataset, start_page, _ in finished])
+        with _crawled_lock:
+            _crawled.difference_update(finished)
+
+
+def _release():
+    if _coordinator is not None:
+        _coordinator.call("release", owner=owner)
+        with _crawled_lock:
+            _crawled.clear()
+    else:
+        fileManifest.releaseLeases(owner)
+
+
+def claim(datasets):
+
+    ## (dataset, start_page, end_page) for the next range this shard owns, or None
+
+    if _coordinator is not None:
+        lease = _coordinator.call("claim", owner=owner, datasets=list(datasets), pages=_pages, seconds=_lease_seconds)
+        return tuple(lease) if lease else None
+    return fileManifest.claimLease(owner, datasets, _pages, _lease_seconds)
+
+
+def crawled(dataset, start_page, end_page):
+
+    ## Every page of the range is listed, the lease stays held until its files are done
+
+    if _coordinator is not None:
+        _coordinator.call("crawled", owner=owner, dataset=dataset, start_page=start_page)
+        with _crawled_lock:
+            _crawled.add((dataset, start_page, end_page))
+    else:
+        fileManifest.markLeaseCrawled(owner, dataset, start_page)
+
+
+def datasetEnded(dataset, page):
+    if _coordinator is not None:
+        _coordinator.call("datasetEnd", dataset=dataset, page=page)
+    else:
+        fileManifest.recordDatasetEnd(dataset, page)
+
+
+def othersActive():
+
+    ## True while another shard still holds a live lease, which could expire and need claiming
+
+    if _coordinator is not None:
+        return _coordinator.call("active", exclude_owner=owner) > 0
+    return fileManifest.activeLeases(exclude_owner=owner) > 0
+
+
+def stop():
+
+    ## Close finished ranges and hand back the rest (interrupted crawls, cancelled downloads)
+
+    global _renewer
+
+    if owner is None:
+        return
+
+    _stop.set()
+    if _renewer is not None:
+        _renewer.join()
+        _renewer = None
+
+    try:
+        _complete()
+        _release()
+    except OSError:
+        pass  # coordinator unreachable: the leases expire by themselves and are claimed again
@@ -0,0 +1,142 @@
+import heapq
+import itertools
+import sqlite3
+import time
+
+import workQueue
+
+
+## Persistent variant of the download pool. Every queued item is a row in a small SQLite file
+## until a worker reports it done (a placeholder only once its alternate probe has finished), so
+## the pool (alternates from the probe stage included) survives a crash and the next start
+## resumes it at once. Only a window of the lowest (dataset, page) items is kept in memory; the
+## rest stays on disk and is read back in batches as the window drains. Discovery can run far ahead of the downloads while memory stays flat, bounded by
+## maxsize (0: unbounded) instead of the window. A url is only queued once.
+
+QUEUE_FILE = "pool_queue.db"
+
+
+def queuePath(path=QUEUE_FILE, shard=None):
+    # each shard keeps its own queue, next to its completion journal
+    return f"{path}.{shard}" if shard else path
+
+
+class SpillQueue(workQueue.WorkQueue):
+
+    def __init__(self, path=QUEUE_FILE, window=600, maxsize=0, on_wait=None):
+        super().__init__(maxsize, on_wait)
+        self.path = path
+        self.window = max(1, int(window))
+
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS queue (
+                url TEXT PRIMARY KEY,
+                dataset INTEGER NOT NULL,
+                page INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                queued REAL NOT NULL,
+                resident INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS queue_order ON queue (resident, dataset, page, seq);
+        """)
+
+        # whatever was in memory or in flight when the last run stopped is back on disk
+        self._db.execute("UPDATE queue SET resident = 0 WHERE resident != 0")
+        count, last_seq = self._db.execute("SELECT COUNT(*), MAX(seq) FROM queue").fetchone()
+
+        self._seq = itertools.count((last_seq or 0) + 1)
+        self._spilled = count          # rows on disk that are not in the window
+        self._spill_min = self._lowestSpilled()
+        self._unfinished = count
+        self.recovered = count         # items carried over from the last run
+
+    def _lowestSpilled(self):
+        row = self._db.execute(
+            "SELECT dataset, page FROM queue WHERE resident = 0 ORDER BY dataset, page LIMIT 1"
+        ).fetchone()
+        return tuple(row) if row else None
+
+    # storage hooks, called by WorkQueue with the lock held
+
+    def _len(self):
+        return len(self._heap) + self._spilled
+
+    def _push(self, item):
+        key = (item[0], item[1])
+        seq = next(self._seq)
+
+        # stay in order: an item behind something already spilled goes to disk as well
+        resident = len(self._heap) < self.window and (self._spill_min is None or key <= self._spill_min)
+
+        added = self._db.execute(
+            "INSERT OR IGNORE INTO queue (url, dataset, page, seq, queued, resident) VALUES (?, ?, ?, ?, ?, ?)",
+            (item[2], item[0], item[1], seq, time.time(), int(resident))
+        ).rowcount
+        if not added:
+            return False  # already queued or in flight
+
+        if resident:
+            heapq.heappush(self._heap, (item[0], item[1], seq, time.monotonic(), item))
+        else:
+            self._spilled += 1
+            self._spill_min = key if self._spill_min is None else min(self._spill_min, key)
+        return True
+
+    def _pop(self):
+        if self._spilled and (len(self._heap) <= self.window // 2 or self._spill_min < self._heap[0][:2]):
+            self._refill()
+        _, _, _, queued_at, item = heapq.heappop(self._heap)
+        return queued_at, item
+
+    def _refill(self):
+
+        ## Move the lowest spilled rows into the window
+
+        rows = self._db.execute(
+            "SELECT url, dataset, page, seq, queued FROM queue WHERE resident = 0 ORDER BY dataset, page, seq LIMIT ?",
+            (max(1, self.window - len(self._heap)),)
+        ).fetchall()
+
+        self._db.execute("BEGIN")
+        try:
+            self._db.executemany("UPDATE queue SET resident = 1 WHERE url = ?", [(row[0],) for row in rows])
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+        now, now_wall = time.monotonic(), time.time()
+        for url, dataset, page, seq, queued in rows:
+            # wait time keeps counting from the original put, also across restarts
+            heapq.heappush(self._heap, (dataset, page, seq, now - max(0.0, now_wall - queued), (dataset, page, url)))
+
+        self._spilled -= len(rows)
+        self._spill_min = self._lowestSpilled() if self._spilled else None
+
+    def _clear(self):
+        # cancelled: forget the items here, the rows stay on disk for the next run
+        removed = self._len()
+        self._heap.clear()
+        self._spilled = 0
+        self._spill_min = None
+        return removed
+
+    def task_done(self, item=None):
+        if item is not None:
+            with self._lock:
+                if self._db is not None:
+                    self._db.execute("DELETE FROM queue WHERE url = ?", (item[2],))
+        super().task_done(item)
+
+    def spilled(self):
+        with self._lock:
+            return self._spilled
+
+    def release(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
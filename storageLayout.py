@@ -0,0 +1,191 @@
+import os
+import re
+import time
+import warnings
+import zipfile
+import zlib
+
+import fileManifest
+
+
+## Where a downloaded file lives under the output directory. "flat" keeps every file of a dataset
+## in one "Dataset N" directory, which gets slow to list, stat and back up with hundreds of
+## thousands of entries. "sharded" adds one directory per bucket_size EFTA numbers
+## (Dataset N/00039/EFTA00039025.pdf), and an alternate lands next to its PDF. "packed" downloads
+## like "sharded" and then moves finished files of at most packMaxBytes into one zip archive per
+## bucket (Dataset N/packs/00039.zip, stored uncompressed so members stay cheap to read), indexed
+## in the manifest's packed table. migrate() moves an existing tree to another layout.
+
+LAYOUTS = ("flat", "sharded", "packed")
+PACK_DIR = "packs"
+OTHER_BUCKET = "other"  # names without an EFTA number
+
+_EFTA = re.compile(r"EFTA(\d+)")
+
+_layout = "flat"
+_bucket_size = 1000
+
+
+def configure(layout="flat", bucket_size=1000):
+    global _layout, _bucket_size
+    if layout not in LAYOUTS:
+        raise ValueError(f"storageLayout must be one of {', '.join(LAYOUTS)}, not {layout!r}")
+    _layout = layout
+    _bucket_size = max(1, int(bucket_size))
+
+
+def layout():
+    return _layout
+
+
+def bucket(filename):
+    match = _EFTA.search(filename)
+    if match is None:
+        return OTHER_BUCKET
+    return f"{int(match.group(1)) // _bucket_size:05d}"
+
+
+def datasetDir(out_dir, dataset):
+    return os.path.join(out_dir, f"Dataset {dataset}")
+
+
+def filePath(out_dir, dataset, filename, layout=None):
+
+    ## Path of the loose file; a packed file is found through the manifest instead, see openFile
+
+    if (layout or _layout) == "flat":
+        return os.path.join(datasetDir(out_dir, dataset), filename)
+    return os.path.join(datasetDir(out_dir, dataset), bucket(filename), filename)
+
+
+def archivePath(out_dir, dataset, filename):
+    return os.path.join(datasetDir(out_dir, dataset), PACK_DIR, bucket(filename) + ".zip")
+
+
+def openFile(url, path):
+
+    ## Binary file object for a finished file, loose or packed
+
+    if os.path.exists(path):
+        return open(path, "rb")
+
+    entry = fileManifest.packedEntry(url)
+    if entry is None:
+        raise FileNotFoundError(path)
+    with zipfile.ZipFile(entry["archive"]) as archive:
+        return archive.open(entry["member"])  # keeps the archive open until the member is closed
+
+
+def needsMigration(out_dir, datasets, layout=None):
+
+    ## Quick look at the top of each dataset directory: loose files there under a sharded layout,
+    ## or bucket directories under the flat one, mean the tree was written with another layout
+
+    sharded = (layout or _layout) != "flat"
+    for dataset in datasets:
+        base = datasetDir(out_dir, dataset)
+        if not os.path.isdir(base):
+            continue
+        with os.scandir(base) as entries:
+            for entry in entries:
+                if sharded and entry.is_file():
+                    return True
+                if not sharded and entry.is_dir() and entry.name != PACK_DIR:
+                    return True
+    return False
+
+
+def migrate(out_dir, datasets, layout=None):
+
+    ## Move every loose file (.part files included, so downloads still resume) of datasets to
+    ## where layout puts it, and drop directories left empty. Returns the number of files moved.
+
+    moves = []
+    for dataset in datasets:
+        base = datasetDir(out_dir, dataset)
+        if not os.path.isdir(base):
+            continue
+
+        for root, dirs, names in os.walk(base):
+            dirs[:] = [d for d in dirs if not (root == base and d == PACK_DIR)]
+            for name in names:
+                stem, suffix = (name[:-5], ".part") if name.endswith(".part") else (name, "")
+                source = os.path.join(root, name)
+                target = filePath(out_dir, dataset, stem, layout) + suffix
+                if source == target:
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(source, target)
+                moves.append((source, target))
+
+        for root, dirs, names in os.walk(base, topdown=False):
+            if root != base and not os.listdir(root):
+                os.rmdir(root)
+
+    if moves:
+        fileManifest.renameBlobPaths(moves)
+    return len(moves)
+
+
+def _crc(path):
+    crc = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            crc = zlib.crc32(block, crc)
+    return crc
+
+
+def pack(out_dir, datasets, max_size, log=None):
+
+    ## Move finished files of at most max_size bytes into their bucket's archive. The archive is
+    ## closed before the index points into it and the loose file is only removed after that, so
+    ## an interrupted pack leaves every file readable. Bucket directories left empty are removed.
+    ## Returns the number of files packed.
+
+    groups = {}
+    for row in fileManifest.packCandidates(datasets, max_size):
+        filename = os.path.basename(row["url"])
+        path = filePath(out_dir, row["dataset"], filename)
+        try:
+            if os.path.getsize(path) != row["local_size"]:
+                continue
+        except OSError:
+            continue
+        groups.setdefault(archivePath(out_dir, row["dataset"], filename), []).append((row["url"], path, filename, row["local_size"]))
+
+    packed = 0
+    emptied = set()
+    for archive_path, files in groups.items():
+        os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+        try:
+            with zipfile.ZipFile(archive_path, "a", compression=zipfile.ZIP_STORED) as archive:
+                present = {info.filename: info.CRC for info in archive.infolist()}
+                for url, path, member, size in files:
+                    # an identical member was written by a pack that stopped before indexing it;
+                    # a different one is a copy verify re-queued, shadowed by the newer member
+                    if present.get(member) != _crc(path):
+                        with warnings.catch_warnings():
+                            warnings.simplefilter("ignore", UserWarning)  # duplicate name
+                            archive.write(path, member)
+        except (OSError, zipfile.BadZipFile) as e:
+            if log is not None:
+                log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} | Packing failed: {archive_path} | {type(e).__name__} | {e}", event="pack_failed", path=archive_path, error=str(e))
+            continue
+
+        fileManifest.recordPacked([(url, archive_path, member, size) for url, _, member, size in files])
+        for _, path, _, _ in files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            if os.path.dirname(path) != os.path.dirname(os.path.dirname(archive_path)):  # a bucket, not the dataset
+                emptied.add(os.path.dirname(path))
+        packed += len(files)
+
+    for directory in emptied:
+        try:
+            os.rmdir(directory)  # only succeeds once nothing (not even a .part file) is left
+        except OSError:
+            pass
+
+    return packed
@@ -0,0 +1,245 @@
+import importlib.util
+import time
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import metrics
+
+try:
+    import httpx
+except ImportError:  # optional, only needed for http2: true
+    httpx = None
+
+if importlib.util.find_spec("h2") is None:  # httpx needs it for http2=True
+    httpx = None
+
+
+## Connection layer under the shared session. The default HTTPAdapter keeps 10 connections per
+## host, so with more threads than that every extra connection is thrown away after its request
+## and the next one pays a new TCP and TLS handshake. mount() sizes the pool to the threads that
+## share the session and counts every request, every new connection (with its handshake time)
+## and the time to the response headers, so connection reuse shows up in metrics and status.
+## With http2 (httpx and h2 installed) the session sends everything through one httpx client
+## that multiplexes HEAD probes and downloads as streams over a few connections.
+
+HTTP1 = "http/1.1"
+HTTP2 = "http/2"
+
+
+def http2Available():
+    return httpx is not None
+
+
+def _connected(protocol, seconds):
+    metrics.connections.inc(labels={"protocol": protocol})
+    metrics.connect_seconds.observe(seconds, labels={"protocol": protocol})
+
+
+def _responded(protocol, method, seconds):
+    metrics.http_requests.inc(labels={"protocol": protocol})
+    metrics.response_ttfb_seconds.observe(seconds, labels={"method": method, "protocol": protocol})
+
+
+def connectionStats():
+
+    ## Requests sent and connections opened so far, and the share of requests on a reused connection
+
+    sent = metrics.http_requests.total()
+    opened = metrics.connections.total()
+    return {
+        "requests": sent,
+        "connections": opened,
+        "reused": max(0, sent - opened),
+        "reuse": round(max(0.0, 1 - opened / sent), 3) if sent else None,
+    }
+
+
+# HTTP/1.1: urllib3 pools whose connections time their own handshake
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.monotonic()
+        super().connect()
+        _connected(HTTP1, time.monotonic() - started)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.monotonic()
+        super().connect()  # TCP connect and TLS handshake
+        _connected(HTTP1, time.monotonic() - started)
+
+
+class _HTTPPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _HTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+
+    ## HTTPAdapter with instrumented connection pools, sized by pool_maxsize
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _HTTPPool, "https": _HTTPSPool}
+
+    def send(self, request, **kwargs):
+        started = time.monotonic()
+        r = super().send(request, **kwargs)
+        _responded(HTTP1, request.method, time.monotonic() - started)
+        return r
+
+
+# HTTP/2: a requests adapter in front of one shared httpx client
+
+class _RawStream:
+
+    ## The file-like Response.raw requests reads an httpx body through
+
+    def __init__(self, response):
+        self._response = response
+        self._chunks = response.iter_bytes()
+        self._rest = b""
+
+    def read(self, amt=None, decode_content=None):
+        try:
+            if amt is None:
+                data = self._rest + b"".join(self._chunks)
+                self._rest = b""
+                return data
+
+            if not self._rest:
+                self._rest = next(self._chunks, b"")
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(e)
+        except (httpx.HTTPError, httpx.StreamError) as e:
+            raise requests.ConnectionError(e)
+
+        data, self._rest = self._rest[:amt], self._rest[amt:]
+        return data
+
+    def close(self):
+        self._response.close()
+
+    def release_conn(self):
+        self._response.close()
+
+
+def _timeout(timeout):
+    # requests takes seconds or (connect, read)
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(connect=connect, read=read, write=read, pool=None)
+    return httpx.Timeout(timeout, pool=None)
+
+
+def _trace(scheme):
+
+    ## httpcore trace hook, called only when the request opens a new connection
+
+    started = [None]
+
+    def trace(event, info):
+        if event == "connection.connect_tcp.started":
+            started[0] = time.monotonic()
+        elif started[0] is not None and (event == "connection.start_tls.complete" or
+                                         (event == "connection.connect_tcp.complete" and scheme == "http")):
+            _connected(HTTP2 if scheme == "https" else HTTP1, time.monotonic() - started[0])
+            started[0] = None
+
+    return trace
+
+
+class HTTP2Adapter(BaseAdapter):
+
+    def __init__(self, connections=10):
+        super().__init__()
+        self._client = httpx.Client(
+            http2=True,
+            follow_redirects=False,  # the session resolves redirects itself
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+        )
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        scheme = request.url.split(":", 1)[0]
+        hx_request = self._client.build_request(
+            request.method, request.url, headers=list(request.headers.items()), content=request.body,
+            timeout=_timeout(timeout), extensions={"trace": _trace(scheme)},
+        )
+
+        started = time.monotonic()
+        try:
+            hx = self._client.send(hx_request, stream=True)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(e, request=request)
+        except httpx.HTTPError as e:
+            raise requests.ConnectionError(e, request=request)
+        _responded(HTTP2 if hx.http_version == "HTTP/2" else HTTP1, request.method, time.monotonic() - started)
+
+        response = requests.Response()
+        response.status_code = hx.status_code
+        response.headers = CaseInsensitiveDict(hx.headers.items())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.reason = hx.reason_phrase
+        response.raw = _RawStream(hx)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        self._client.close()
+
+
+def mount(session, connections, http2=False):
+
+    ## Install the instrumented transport on session with room for `connections` concurrent
+    ## requests. Returns the protocol asked for, falling back to HTTP/1.1 without httpx and h2.
+
+    connections = max(1, int(connections))
+
+    if http2 and http2Available():
+        adapter = HTTP2Adapter(connections)
+        protocol = HTTP2
+    else:
+        adapter = PooledAdapter(pool_connections=4, pool_maxsize=connections)
+        protocol = HTTP1
+
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return protocol
+
+
+def aiohttpTrace():
+
+    ## The same request and connection stats for the asyncio engine
+
+    import aiohttp
+
+    trace = aiohttp.TraceConfig()
+
+    async def request_start(session, context, params):
+        context.started = time.monotonic()
+
+    async def request_end(session, context, params):
+        _responded(HTTP1, params.method, time.monotonic() - context.started)
+
+    async def connection_start(session, context, params):
+        context.connecting = time.monotonic()
+
+    async def connection_end(session, context, params):
+        _connected(HTTP1, time.monotonic() - context.connecting)
+
+    trace.on_request_start.append(request_start)
+    trace.on_request_end.append(request_end)
+    trace.on_connection_create_start.append(connection_start)
+    trace.on_connection_create_end.append(connection_end)
+    return trace
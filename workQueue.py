@@ -0,0 +1,184 @@
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+
+## Bounded priority queue for the download pool. Items are (dataset, page, url) tuples served in
+## (dataset, page) order, so the oldest pages finish first and resume points stay tight.
+## put() blocks while the queue is full, which is the producer's backpressure, and get() blocks
+## until there is work, so neither side has to poll. close() lets consumers drain what is left
+## and then return None; cancel() drops everything pending and releases every waiter at once.
+## A url that is already queued or in flight (taken, but not reported with task_done yet) is not
+## queued again, so two workers never download the same file at the same time.
+
+
+class WorkQueue:
+
+    def __init__(self, maxsize=0, on_wait=None):
+        self.maxsize = maxsize
+        self.on_wait = on_wait  # called with each item's wait in seconds, outside the lock
+        self._heap = []
+        self._seq = itertools.count()  # keeps FIFO order within the same (dataset, page)
+        self._urls = set()             # queued or in flight
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._all_done = threading.Condition(self._lock)
+        self._unfinished = 0
+        self._closed = False
+        self._cancelled = False
+
+        # time items spend waiting in the queue, from put to get
+        self.wait_total = 0.0
+        self.wait_count = 0
+        self.wait_max = 0.0
+
+    def _full(self):
+        return 0 < self.maxsize <= self._len()
+
+    # storage hooks, always called with the lock held; spillQueue.SpillQueue keeps most items on disk
+
+    def _len(self):
+        return len(self._heap)
+
+    def _push(self, item):
+        # False when the item was not added
+        if item[2] in self._urls:
+            return False
+        self._urls.add(item[2])
+        heapq.heappush(self._heap, (item[0], item[1], next(self._seq), time.monotonic(), item))
+        return True
+
+    def _pop(self):
+        _, _, _, queued_at, item = heapq.heappop(self._heap)
+        return queued_at, item
+
+    def _clear(self):
+        removed = len(self._heap)
+        for entry in self._heap:
+            self._urls.discard(entry[4][2])
+        self._heap.clear()
+        return removed
+
+    def put(self, item, block=True, timeout=None, force=False):
+
+        ## Queue an item, blocking while the queue is full unless force is set (alternates
+        ## from the probe stage must never wait on the workers). Returns False when the
+        ## queue no longer accepts work, raises queue.Full on timeout.
+
+        with self._not_full:
+            if self._closed or self._cancelled:
+                return False
+
+            if not force and block:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self._full() and not (self._closed or self._cancelled):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise queue.Full
+                    self._not_full.wait(remaining)
+
+                if self._closed or self._cancelled:
+                    return False
+
+            elif not force and self._full():
+                raise queue.Full
+
+            if self._push(item):
+                self._unfinished += 1
+                self._not_empty.notify()
+            return True
+
+    def get(self, timeout=None):
+
+        ## Next item in (dataset, page) order. Returns None once the queue is closed and
+        ## drained or has been cancelled, raises queue.Empty on timeout.
+
+        with self._not_empty:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._len():
+                if self._closed or self._cancelled:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._not_empty.wait(remaining)
+
+            if self._cancelled:
+                return None
+
+            queued_at, item = self._pop()
+
+            waited = time.monotonic() - queued_at
+            self.wait_total += waited
+            self.wait_count += 1
+            self.wait_max = max(self.wait_max, waited)
+
+            self._not_full.notify()
+
+        if self.on_wait is not None:
+            self.on_wait(waited)
+        return item
+
+    def task_done(self, item=None):
+        # item: the finished item, queued again from now on; without it the url stays claimed
+        with self._all_done:
+            if item is not None:
+                self._urls.discard(item[2])
+            self._unfinished = max(0, self._unfinished - 1)
+            if self._unfinished == 0:
+                self._all_done.notify_all()
+
+    def join(self):
+        with self._all_done:
+            while self._unfinished:
+                self._all_done.wait()
+
+    def unfinished(self):
+        with self._lock:
+            return self._unfinished
+
+    def close(self):
+
+        ## No more work is coming, consumers exit once the queue is empty
+
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def cancel(self):
+
+        ## Drop every pending item and wake all waiting producers and consumers.
+        ## Returns the number of items removed.
+
+        with self._lock:
+            removed = self._clear()
+            self._cancelled = True
+            self._unfinished = max(0, self._unfinished - removed)
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+            self._all_done.notify_all()
+            return removed
+
+    def qsize(self):
+        with self._lock:
+            return self._len()
+
+    def full(self):
+        with self._lock:
+            return self._full()
+
+    def empty(self):
+        with self._lock:
+            return not self._len()
+
+    def averageWait(self):
+        with self._lock:
+            return self.wait_total / self.wait_count if self.wait_count else 0.0
+
+    def release(self):
+        # nothing held outside memory; SpillQueue closes its file here
+        pass